@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Banc de mesure hors ligne des extracteurs sur un corpus de pages Equidia sauvegardées.
+
+    python bench_parsers.py snapshot   # constitue le corpus depuis le cache HTML et le calendrier
+    python bench_parsers.py run        # mesure et compare aux sorties de référence
+
+Le corpus (dossier bench_corpus/) contient :
+  - pages/<nom>.html : HTML brut
+  - golden/<nom>.json : sortie de référence des extracteurs, calculée avec la logique
+    d'extraction d'origine sur le document complet parsé par html.parser, et non par
+    le chemin mesuré
+  - manifest.json : type de page (course ou programme), arguments et étiquettes
+    (galop, np, sans_tracking) pour vérifier la couverture
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+import scrapper_page
+from scrapper_page import configure_cache, parse_page, parse_sections, race_url, read_cache, CACHE_DIR
+from scrapper_list_course import LIST_URL, extract_course_info
+from scrapper_condition_course import extract_course
+from scrapper_tracking_course import extract_tracking_data
+from scrapper_table_arrive import extract_table_arrive_data
+from race_calendar import CALENDAR_FILE, open_calendar
+
+CORPUS_DIR = "bench_corpus"
+REQUIRED_TAGS = ("galop", "np", "sans_tracking")
+GALOP_DISCIPLINES = ("plat", "haies", "steeple", "cross", "obstacle")
+
+# Chaque extracteur mesuré : (type de page, fonction page -> sortie)
+def _race(extract):
+    return lambda html, args: extract(parse_sections(html), *args)
+
+EXTRACTORS = {
+    "scraper_course": ("course", _race(extract_course)),
+    "scrape_tracking_data": ("course", _race(extract_tracking_data)),
+    "scrape_table_arrive_data": ("course", _race(extract_table_arrive_data)),
+    "scrape_race_page": ("course", lambda html, args: race_outputs(parse_sections(html), args)),
+    "get_course_info": ("programme", lambda html, args: extract_course_info(parse_page(html), *args)),
+}
+
+def race_outputs(soup, args):
+    return {
+        "conditions": extract_course(soup, *args),
+        "tracking": extract_tracking_data(soup, *args),
+        "table_arrive": extract_table_arrive_data(soup, *args),
+    }
+
+def reference_page(html):
+    """
+    Document de référence : page complète parsée par html.parser, sans retrait des
+    blocs script/style ni sélection des sections. Les sorties de référence ne doivent
+    pas dépendre du chemin rapide (parse_sections, parse_page) qu'elles vérifient.
+    """
+    return BeautifulSoup(html, "html.parser")
+
+def reference_tracking(soup, date, reunion, course):
+    """
+    Extraction d'origine du tracking, avant sa limitation à la table de tracking :
+    lignes prises sur toute la page (find_all("tr")[1:]). Conservée telle quelle pour
+    que les sorties de référence vérifient aussi ce changement de sélection.
+    """
+    tracking_data = {"date": date, "reunion": reunion, "course": course, "discipline": None, "details": []}
+    try:
+        discipline_section = soup.find("div", {"id": "conditions", "class": "default"})
+        if discipline_section:
+            discipline_info = discipline_section.find("div", {"class": "condition-summary--main--info"})
+            if discipline_info and "Discipline" in discipline_info.text:
+                tracking_data["discipline"] = discipline_info.text.replace("Discipline", "").strip()
+
+        headers = []
+        table_header = soup.find("tr", {"class": "tracking-table--header"})
+        if table_header:
+            headers = [th.text.strip().lower().replace(" ", "_") for th in table_header.find_all("th")]
+
+        for row in soup.find_all("tr")[1:]:
+            horse_data = {}
+            num_span = row.find("span", {"class": "partant-col--num"})
+            nom_span = row.find("span", {"class": "partant-col--cheval"})
+            classement_td = row.find("td", {"class": "first-col strong-col"})
+            horse_data["numero"] = num_span.text.strip() if num_span else None
+            horse_data["nom"] = nom_span.text.strip() if nom_span else None
+            horse_data["classement"] = classement_td.text.strip() if classement_td else None
+
+            for idx, span in enumerate(row.find_all("span", class_="align-group")):
+                if idx + 3 < len(headers):
+                    horse_data[headers[idx + 3]] = span.text.strip()
+
+            if horse_data.get("numero") and horse_data.get("nom"):
+                tracking_data["details"].append(horse_data)
+    except Exception as e:
+        print(f"Erreur lors de l'extraction des données pour {date}/{reunion}/{course}: {e}")
+    return tracking_data
+
+def reference_outputs(html, args):
+    """
+    Sorties de référence d'une page de course : document de référence et logique
+    d'extraction d'origine (les extracteurs des conditions et de la table d'arrivée
+    n'ont pas changé, celui du tracking est reference_tracking).
+    """
+    soup = reference_page(html)
+    return {
+        "conditions": extract_course(soup, *args),
+        "tracking": reference_tracking(soup, *args),
+        "table_arrive": extract_table_arrive_data(soup, *args),
+    }
+
+def page_tags(outputs):
+    """Étiquettes de couverture d'une page de course à partir de ses sorties."""
+    tags = []
+    conditions = outputs.get("conditions") or {}
+    discipline = (conditions.get("discipline") or "").lower()
+    if any(name in discipline for name in GALOP_DISCIPLINES):
+        tags.append("galop")
+    table_arrive = outputs.get("table_arrive") or {}
+    if any(row.get("classement") == "NP" for row in table_arrive.get("result", [])):
+        tags.append("np")
+    tracking = outputs.get("tracking") or {}
+    if not tracking.get("details"):
+        tags.append("sans_tracking")
+    return tags
+
+def load_manifest(corpus_dir):
+    with open(os.path.join(corpus_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def read_page(corpus_dir, name):
+    with open(os.path.join(corpus_dir, "pages", f"{name}.html"), "r", encoding="utf-8") as f:
+        return f.read()
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+
+def snapshot(corpus_dir, cache_dir, calendar_file, limit):
+    """
+    Copie dans le corpus des pages présentes dans le cache HTML (sans accès réseau),
+    en partant des courses du calendrier, et enregistre leur sortie de référence
+    (logique d'extraction d'origine sur le document de référence, voir reference_outputs).
+    Les pages couvrant les étiquettes requises sont retenues en priorité.
+    """
+    configure_cache(cache_dir, offline=True)
+    os.makedirs(os.path.join(corpus_dir, "pages"), exist_ok=True)
+    os.makedirs(os.path.join(corpus_dir, "golden"), exist_ok=True)
+
+    calendar = open_calendar(calendar_file)
+    races = calendar.execute(
+        "SELECT date, reunion, course FROM race_status ORDER BY date DESC, reunion, course"
+    ).fetchall()
+    dates = sorted({race[0] for race in races}, reverse=True)
+    calendar.close()
+
+    candidates = []
+    for date, reunion, course in races:
+        html = read_cache(race_url(date, reunion, course))
+        if html is None:
+            continue
+        args = [date, reunion, course]
+        outputs = reference_outputs(html, args)
+        candidates.append((f"{date}_{reunion}_{course}", "course", args, html, outputs, page_tags(outputs)))
+
+    # D'abord une page par étiquette requise, puis les autres jusqu'à la limite
+    selected = []
+    for tag in REQUIRED_TAGS:
+        for candidate in candidates:
+            if tag in candidate[5] and candidate not in selected:
+                selected.append(candidate)
+                break
+    for candidate in candidates:
+        if len(selected) >= limit:
+            break
+        if candidate not in selected:
+            selected.append(candidate)
+
+    for date in dates[:max(1, limit // 10)]:
+        html = read_cache(LIST_URL.format(date=date))
+        if html is not None:
+            selected.append((f"{date}_programme", "programme", [date], html,
+                             extract_course_info(reference_page(html), date), []))
+
+    manifest = []
+    for name, kind, args, html, outputs, tags in selected:
+        with open(os.path.join(corpus_dir, "pages", f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        write_json(os.path.join(corpus_dir, "golden", f"{name}.json"), outputs)
+        manifest.append({"name": name, "kind": kind, "args": args, "tags": tags})
+    write_json(os.path.join(corpus_dir, "manifest.json"), manifest)
+
+    print(f"{len(manifest)} pages copiées dans {corpus_dir}.")
+    report_coverage(manifest)
+
+def report_coverage(manifest):
+    for tag in REQUIRED_TAGS:
+        count = sum(tag in page["tags"] for page in manifest)
+        mark = "✅" if count else "❌"
+        print(f"{mark} {tag} : {count} pages")
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def golden_output(name, extractor, corpus_dir):
+    """Sortie de référence d'un extracteur pour une page."""
+    with open(os.path.join(corpus_dir, "golden", f"{name}.json"), "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    key = {
+        "scraper_course": "conditions",
+        "scrape_tracking_data": "tracking",
+        "scrape_table_arrive_data": "table_arrive",
+    }.get(extractor)
+    return golden[key] if key else golden
+
+def run(corpus_dir, repeat, only=None):
+    """
+    Mesure chaque extracteur sur le corpus : pages/s, latence p50/p99 par page,
+    pic mémoire (tracemalloc) et conformité aux sorties de référence.
+    Retourne le nombre de sorties non conformes.
+    """
+    manifest = load_manifest(corpus_dir)
+    pages = {page["name"]: read_page(corpus_dir, page["name"]) for page in manifest}
+    report_coverage(manifest)
+    print(f"Parser HTML : {scrapper_page.HTML_PARSER}\n")
+    print(f"{'extracteur':<26}{'pages':>7}{'pages/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'pic Mo':>9}{'écarts':>8}")
+
+    mismatches = 0
+    for extractor, (kind, func) in EXTRACTORS.items():
+        if only and extractor not in only:
+            continue
+        selected = [page for page in manifest if page["kind"] == kind]
+        if not selected:
+            continue
+
+        # Conformité (et mise en route) avant la mesure
+        errors = 0
+        for page in selected:
+            # Aller-retour JSON pour comparer comme la sortie de référence
+            output = json.loads(json.dumps(func(pages[page["name"]], page["args"]), ensure_ascii=False))
+            if output != golden_output(page["name"], extractor, corpus_dir):
+                errors += 1
+                print(f"❌ {extractor} : sortie différente pour {page['name']}")
+        mismatches += errors
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in selected:
+                page_start = time.perf_counter()
+                func(pages[page["name"]], page["args"])
+                latencies.append(time.perf_counter() - page_start)
+        elapsed = time.perf_counter() - start
+
+        # Pic mémoire mesuré sur une passe séparée : tracemalloc fausse les temps
+        tracemalloc.start()
+        for page in selected:
+            func(pages[page["name"]], page["args"])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{extractor:<26}{len(selected):>7}{len(latencies) / elapsed:>10.1f}"
+              f"{percentile(latencies, 50) * 1000:>9.2f}{percentile(latencies, 99) * 1000:>9.2f}"
+              f"{peak / 1e6:>9.1f}{errors:>8}")
+
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de mesure hors ligne des extracteurs")
+    parser.add_argument("--corpus", default=CORPUS_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Constitue le corpus depuis le cache HTML")
+    snapshot_parser.add_argument("--cache-dir", default=CACHE_DIR)
+    snapshot_parser.add_argument("--calendar", default=CALENDAR_FILE)
+    snapshot_parser.add_argument("--limit", type=int, default=200)
+
+    run_parser = subparsers.add_parser("run", help="Mesure les extracteurs sur le corpus")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--only", nargs="*", choices=list(EXTRACTORS))
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        snapshot(args.corpus, args.cache_dir, args.calendar, args.limit)
+    else:
+        sys.exit(1 if run(args.corpus, args.repeat, args.only) else 0)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from jsonl_store import RACE_KEY, load_records, read_new_lines
+from to_db import create_tables
+from condition_course_to_db import insert_races, race_id_map
+from table_arrive_to_db import insert_data
+from tracking_to_db import insert_tracking, process_json
+import horse_features
+import entity_stats
+from db_connection import get_connection
+
+def read_watermark(conn, path):
+    """
+    Retourne (offset, inode, fin de la dernière lecture) du dernier chargement de
+    `path`, ou (0, None, 0).
+    """
+    row = conn.execute(
+        "SELECT file_offset, file_inode, COALESCE(read_offset, file_offset) FROM ingest_state WHERE source = ?",
+        (os.path.abspath(path),)
+    ).fetchone()
+    return row if row else (0, None, 0)
+
+def save_watermark(conn, path, offset, inode, read_offset=None):
+    conn.execute("""
+        INSERT INTO ingest_state (source, file_offset, file_inode, updated_at, read_offset)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(source) DO UPDATE SET
+            file_offset = excluded.file_offset,
+            file_inode = excluded.file_inode,
+            updated_at = excluded.updated_at,
+            read_offset = excluded.read_offset
+    """, (os.path.abspath(path), offset, inode, datetime.now().isoformat(timespec="seconds"),
+          offset if read_offset is None else read_offset))
+    conn.commit()
+
+def new_records(conn, path, full=False):
+    """
+    Retourne les enregistrements de `path` ajoutés depuis le dernier chargement,
+    le filigrane (offset, inode, fin de la lecture précédente) à enregistrer une fois
+    ceux-ci insérés et la position du début de chaque enregistrement (voir pending_mark).
+
+    Le filigrane est la position en octets dans le fichier JSONL. Il est remis à
+    zéro si le fichier a été remplacé (compaction) ou tronqué ; les upserts rendent
+    ce rechargement sans effet de bord. Un ancien fichier .json est toujours relu en entier.
+    """
+    if not os.path.exists(path):
+        print(f"Le fichier {path} n'existe pas.")
+        return [], None, None
+
+    if not path.endswith(".jsonl"):
+        return load_records(path), None, None
+
+    stat = os.stat(path)
+    offset, inode, read_offset = (0, None, 0) if full else read_watermark(conn, path)
+    if inode != stat.st_ino or offset > stat.st_size:
+        offset = read_offset = 0
+
+    records, positions, end = read_new_lines(path, offset)
+    return records, (end, stat.st_ino, read_offset), positions
+
+def race_key(record):
+    return tuple(record.get(key) for key in RACE_KEY)
+
+def pending_mark(records, mark, positions, race_ids):
+    """
+    Filigrane à enregistrer après l'insertion de `records` (voir new_records).
+
+    Le lanceur concurrent peut écrire les résultats d'une course avant ses conditions :
+    le filigrane s'arrête au premier enregistrement dont la course n'est pas encore
+    dans 'races', et ceux qui suivent sont relus au prochain chargement. Un
+    enregistrement n'attend qu'un chargement : s'il avait déjà été lu (avant la fin
+    de la lecture précédente), sa course ne viendra pas (conditions refusées par
+    race_row) et il est abandonné.
+    Retourne (filigrane, enregistrements en attente, enregistrements abandonnés).
+    """
+    if mark is None:
+        return None, 0, 0
+    end, inode, read_offset = mark
+    unresolved = [
+        position for record, position in zip(records, positions)
+        if all(race_key(record)) and race_key(record) not in race_ids
+    ]
+    pending = [position for position in unresolved if position >= read_offset]
+    offset = pending[0] if pending else end
+    return (offset, inode, end), len(pending), len(unresolved) - len(pending)
+
+def bulk_load(db_file, conditions_file, table_arrive_file, tracking_file, full=False):
+    """
+    Charge les trois fichiers dans la base en une passe, sur une seule connexion
+    et dans l'ordre des dépendances : 'races' d'abord, puis 'results' et 'tracking'.
+    La correspondance (date, reunion, course) -> race_id n'est lue qu'une fois.
+
+    Par défaut, seuls les enregistrements ajoutés depuis le chargement précédent sont
+    lus ; `full` force la relecture complète des fichiers.
+    """
+    start = time.perf_counter()
+    create_tables(db_file)
+
+    conn = get_connection(db_file, mode="bulk")
+    try:
+        races_data, races_mark, _ = new_records(conn, conditions_file, full)
+        races = insert_races(conn, races_data)
+        conn.commit()
+        if races_mark:
+            save_watermark(conn, conditions_file, *races_mark[:2])
+        print(f"{races} courses écrites dans 'races'.")
+
+        race_ids = race_id_map(conn)
+
+        for name, path, insert in (
+            ("results", table_arrive_file, lambda data: insert_data(conn, data, race_ids)),
+            ("tracking", tracking_file, lambda data: insert_tracking(conn, process_json(data), race_ids)),
+        ):
+            data, mark, positions = new_records(conn, path, full)
+            rows = insert(data)
+            mark, pending, dropped = pending_mark(data, mark, positions, race_ids)
+            if mark:
+                save_watermark(conn, path, *mark)
+            print(f"{rows} lignes écrites dans '{name}'.")
+            if pending:
+                print(f"{pending} courses de {path} en attente de leurs conditions : relues au prochain chargement.")
+            if dropped:
+                print(f"{dropped} courses de {path} abandonnées : leurs conditions n'ont pas été enregistrées.")
+
+        # Agrégats par cheval et statistiques par entité : seules les clés des nouvelles
+        # lignes sont recalculées. Avec `full`, les upserts modifient des lignes
+        # existantes : tout est recalculé
+        for module in (horse_features, entity_stats):
+            if full:
+                module.rebuild(conn)
+            else:
+                module.refresh(conn)
+    except sqlite3.Error as e:
+        print(f"Erreur SQLite lors du chargement : {e}")
+    finally:
+        conn.close()
+
+    print(f"Chargement terminé en {time.perf_counter() - start:.1f} s.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="courses.db")
+    parser.add_argument("--conditions", default="condition_course.jsonl")
+    parser.add_argument("--table-arrive", default="table_arrive.jsonl")
+    parser.add_argument("--tracking", default="tracking_course.jsonl")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore les filigranes et relit les fichiers en entier")
+    args = parser.parse_args()
+
+    bulk_load(args.db, args.conditions, args.table_arrive, args.tracking, full=args.full)
@@ -1,11 +1,49 @@
 #!/usr/bin/env python3
+import re
 import sqlite3
-import json
 
-def fill_races(db_file, json_file):
+from jsonl_store import load_records
+from db_connection import get_connection
+
+# Upsert sur la clé (date, reunion, course) : l'id de la course est conservé
+# et ses conditions sont mises à jour si la page a été re-scrapée
+RACE_INSERT = '''
+    INSERT INTO races (
+        date, reunion, course, prix, hippodrome, style, discipline,
+        nombre_de_partants, allocation, terrain, temperature, ciel, vent_vitesse, vent_direction, enjeux_sg
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(date, reunion, course) DO UPDATE SET
+        prix = excluded.prix,
+        hippodrome = excluded.hippodrome,
+        style = excluded.style,
+        discipline = excluded.discipline,
+        nombre_de_partants = excluded.nombre_de_partants,
+        allocation = excluded.allocation,
+        terrain = excluded.terrain,
+        temperature = excluded.temperature,
+        ciel = excluded.ciel,
+        vent_vitesse = excluded.vent_vitesse,
+        vent_direction = excluded.vent_direction,
+        enjeux_sg = excluded.enjeux_sg
+'''
+
+def clean_amount(value):
+    """
+    Convertit un montant affiché ("45 000", "123 456 €") en int, ou None.
+    Les séparateurs de milliers (espaces, espaces insécables) sont ignorés.
+    """
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    digits = re.sub(r"\D", "", str(value))
+    return int(digits) if digits else None
+
+def race_row(race):
     """
-    Insère dans la table 'races' uniquement les courses dont les champs critiques ne sont pas nuls.
-    
+    Transforme les conditions d'une course en ligne de la table 'races'.
+    Retourne None si l'un des champs critiques est nul.
+
     Les champs critiques sont :
       - hippodrome
       - style
@@ -16,56 +54,71 @@ def fill_races(db_file, json_file):
       - enjeux_sg
       - meteo : temperature, ciel, vent_vitesse, vent_direction
     """
-    try:
-        # Connexion à la base de données
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
+    # Extraction des valeurs principales
+    date = race.get("date")
+    reunion = race.get("reunion")
+    course = race.get("course")
+    prix = race.get("prix")
+    hippodrome = race.get("hippodrome")
+    style = race.get("style")
+    discipline = race.get("discipline")
+    nombre_de_partants = race.get("nombre_de_partants")
+    allocation = clean_amount(race.get("allocation"))
+    terrain = race.get("terrain")
+    enjeux_sg = clean_amount(race.get("enjeux_sg"))
 
-        # Lecture du fichier JSON
-        with open(json_file, "r", encoding="utf-8") as f:
-            races_data = json.load(f)
+    # Extraction des données météo
+    meteo = race.get("meteo", {})
+    temperature = meteo.get("temperature")
+    ciel = meteo.get("ciel")
+    vent_vitesse = meteo.get("vent_vitesse")
+    vent_direction = meteo.get("vent_direction")
 
-        # Insertion de chaque course dans la table 'races'
-        for race in races_data:
-            # Extraction des valeurs principales
-            date = race.get("date")
-            reunion = race.get("reunion")
-            course = race.get("course")
-            prix = race.get("prix")
-            hippodrome = race.get("hippodrome")
-            style = race.get("style")
-            discipline = race.get("discipline")
-            nombre_de_partants = race.get("nombre_de_partants")
-            allocation = race.get("allocation")
-            terrain = race.get("terrain")
-            enjeux_sg = race.get("enjeux_sg")
+    # Vérifier que les champs critiques ne sont pas nuls
+    if (hippodrome is None or style is None or discipline is None or
+        nombre_de_partants is None or allocation is None or terrain is None or
+        enjeux_sg is None or
+        temperature is None or ciel is None or vent_vitesse is None or vent_direction is None):
+        return None
 
-            # Extraction des données météo
-            meteo = race.get("meteo", {})
-            temperature = meteo.get("temperature")
-            ciel = meteo.get("ciel")
-            vent_vitesse = meteo.get("vent_vitesse")
-            vent_direction = meteo.get("vent_direction")
+    return (
+        date, reunion, course, prix, hippodrome, style, discipline,
+        nombre_de_partants, allocation, terrain, temperature, ciel, vent_vitesse, vent_direction, enjeux_sg
+    )
+
+def race_id_map(conn):
+    """
+    Charge en mémoire la correspondance (date, reunion, course) -> id de la table 'races',
+    pour éviter un SELECT par enregistrement lors des chargements.
+    """
+    cursor = conn.execute("SELECT date, reunion, course, id FROM races")
+    return {(str(date), reunion, course): race_id for date, reunion, course, race_id in cursor}
+
+def insert_races(conn, races_data):
+    """
+    Insère ou met à jour en une seule requête executemany toutes les courses valides
+    (voir race_row). Retourne le nombre de courses écrites.
+    """
+    rows = [row for row in map(race_row, races_data) if row is not None]
+    before = conn.total_changes
+    conn.executemany(RACE_INSERT, rows)
+    return conn.total_changes - before
+
+def fill_races(db_file, json_file):
+    """
+    Insère dans la table 'races' uniquement les courses dont les champs critiques ne sont pas nuls
+    (voir race_row).
+    """
+    conn = None
+    try:
+        # Connexion à la base de données
+        conn = get_connection(db_file)
 
-            # Vérifier que les champs critiques ne sont pas nuls
-            if (hippodrome is None or style is None or discipline is None or
-                nombre_de_partants is None or allocation is None or terrain is None or
-                enjeux_sg is None or
-                temperature is None or ciel is None or vent_vitesse is None or vent_direction is None):
-                # On ignore cette ligne si l'un des champs critiques est null
-                continue
+        # Lecture du fichier JSONL (ou de l'ancien fichier JSON)
+        races_data = load_records(json_file)
 
-            # Insertion de la course avec INSERT OR IGNORE pour éviter les doublons (clé UNIQUE)
-            query = '''
-                INSERT OR IGNORE INTO races (
-                    date, reunion, course, prix, hippodrome, style, discipline,
-                    nombre_de_partants, allocation, terrain, temperature, ciel, vent_vitesse, vent_direction, enjeux_sg
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            cursor.execute(query, (
-                date, reunion, course, prix, hippodrome, style, discipline,
-                nombre_de_partants, allocation, terrain, temperature, ciel, vent_vitesse, vent_direction, enjeux_sg
-            ))
+        # Upsert sur la clé UNIQUE (date, reunion, course) pour éviter les doublons
+        insert_races(conn, races_data)
 
         # Validation de la transaction
         conn.commit()
@@ -80,5 +133,5 @@ def fill_races(db_file, json_file):
 
 if __name__ == '__main__':
     db_file = "courses.db"
-    json_file = "condition_course.json"
+    json_file = "condition_course.jsonl"
     fill_races(db_file, json_file)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+CATEGORY = "category"
+DATETIME = "datetime64[ns]"
+
+# Types du jeu d'entraînement (prepa_data.py, feature_store.py, deep_learning.py).
+# Chaînes répétées en catégories ; entiers et flottants à la plus petite largeur
+# suffisante pour les valeurs possibles.
+SCHEMA = {
+    # Identifiants
+    "race_id": "int32",
+    "numero": "int8",
+    "date": DATETIME,
+
+    # Conditions de course
+    "hippodrome": CATEGORY,
+    "style": CATEGORY,
+    "race_discipline": CATEGORY,
+    "nombre_de_partants": "int8",
+    "allocation": "int32",
+    "terrain": CATEGORY,
+    "temperature": "int8",
+    "ciel": CATEGORY,
+    "vent_vitesse": "int16",
+    "vent_direction": CATEGORY,
+
+    # Partant
+    "classement": "int8",
+    "cheval": CATEGORY,
+    "jockey": CATEGORY,
+    "entraineur": CATEGORY,
+    "corde": "int8",
+    "poids": "float32",
+
+    # Tracking
+    "vitessemax_kmh": "float32",
+    "temps_officiel": "float32",
+    "derniers600m": "float32",
+    "derniers200m": "float32",
+    "derniers100m": "float32",
+    "distance_reelle": "float32",
+    "distance_vainqueur": "float32",
+
+    # Features temporelles
+    "day_of_week": "int8",
+    "month": "int8",
+    "year": "int16",
+
+    # Agrégats par cheval (horse_features.py)
+    "horse_races": "int16",
+    "horse_avg_classement": "float32",
+    "horse_std_classement": "float32",
+    "horse_podium_rate": "float32",
+    "horse_avg_vmax": "float32",
+
+    # Statistiques par entité (entity_stats.py)
+    "jockey_starts": "int32",
+    "jockey_win_rate": "float32",
+    "jockey_podium_rate": "float32",
+    "entraineur_starts": "int32",
+    "entraineur_win_rate": "float32",
+    "entraineur_podium_rate": "float32",
+    "jockey_entraineur_starts": "int16",
+    "jockey_entraineur_win_rate": "float32",
+    "jockey_entraineur_podium_rate": "float32",
+    "cheval_hippodrome_starts": "int16",
+    "cheval_hippodrome_win_rate": "float32",
+    "cheval_hippodrome_podium_rate": "float32",
+    "cheval_terrain_starts": "int16",
+    "cheval_terrain_win_rate": "float32",
+    "cheval_terrain_podium_rate": "float32",
+}
+
+def apply_schema(df, schema=SCHEMA):
+    """
+    Convertit sur place les colonnes de `df` présentes dans `schema`.
+
+    Une colonne entière qui contient encore des NaN (avant le nettoyage) passe en
+    float32, et une colonne dont les valeurs dépassent la largeur déclarée reste en
+    int64 : une valeur n'est jamais tronquée.
+    """
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+
+        if dtype == CATEGORY:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype(CATEGORY)
+        elif dtype == DATETIME:
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                df[col] = pd.to_datetime(series, errors="coerce")
+        elif dtype.startswith("int"):
+            series = pd.to_numeric(series, errors="coerce")
+            if series.isna().any():
+                df[col] = series.astype("float32")
+                continue
+            bounds = np.iinfo(dtype)
+            if len(series) and (series.min() < bounds.min or series.max() > bounds.max):
+                df[col] = series.astype("int64")
+            else:
+                df[col] = series.astype(dtype)
+        else:
+            df[col] = pd.to_numeric(series, errors="coerce").astype(dtype)
+    return df
+
+def memory_usage(df):
+    """Mémoire occupée par `df` en Mo, chaînes comprises."""
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import sqlite3
+from pathlib import Path
+
+DB_FILE = "courses.db"
+
+# Profils de performance appliqués à chaque connexion.
+# - write : écrivain courant (scrapers, chargeurs incrémentaux)
+# - bulk : rechargement massif, durabilité relâchée (une coupure peut perdre
+#   les dernières transactions, jamais corrompre la base en mode WAL)
+# - readonly : lecteurs (préparation des données, exports) ; en WAL ils ne
+#   bloquent jamais l'écrivain et ne sont pas bloqués par lui
+# - shared : base utilisée par plusieurs machines via un stockage partagé (file de
+#   tâches). Le WAL n'y fonctionne pas (son index -shm est en mémoire partagée,
+#   locale à une machine) : journal d'annulation et verrous sur le fichier
+PROFILES = {
+    "write": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,        # 64 Mo
+        "mmap_size": 268435456,      # 256 Mo
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+        "busy_timeout": 30000,       # ms
+    },
+    "bulk": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256000,       # 256 Mo
+        "mmap_size": 1073741824,     # 1 Go
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+        "busy_timeout": 30000,
+    },
+    "readonly": {
+        "cache_size": -128000,       # 128 Mo
+        "mmap_size": 1073741824,
+        "temp_store": "MEMORY",
+        "query_only": "ON",
+        "busy_timeout": 30000,
+    },
+    "shared": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+}
+
+def get_connection(db_file=DB_FILE, mode="write", **connect_kwargs):
+    """
+    Ouvre une connexion SQLite et lui applique le profil `mode`
+    ('write', 'bulk', 'readonly' ou 'shared').
+    Les arguments supplémentaires sont transmis à sqlite3.connect.
+    """
+    if mode not in PROFILES:
+        raise ValueError(f"Mode de connexion inconnu : {mode}")
+
+    if mode == "readonly":
+        uri = f"{Path(db_file).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, **connect_kwargs)
+    else:
+        conn = sqlite3.connect(db_file, **connect_kwargs)
+
+    for pragma, value in PROFILES[mode].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+
+from to_db import create_tables
+from condition_course_to_db import RACE_INSERT, race_row
+from table_arrive_to_db import RESULT_INSERT, result_rows
+from tracking_to_db import TRACKING_INSERT, process_json, tracking_row
+from db_connection import get_connection
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 5.0  # secondes
+
+def write_batch(conn, batch):
+    """
+    Écrit un lot de courses dans 'races', 'results' et 'tracking' en une seule transaction.
+    Chaque élément du lot est un dictionnaire {"conditions", "tracking", "table_arrive"}
+    tel que retourné par scrapper_race.scrape_race_page.
+    Retourne le nombre de courses écrites (insérées ou mises à jour) dans 'races'.
+    """
+    cursor = conn.cursor()
+    written = 0
+
+    with conn:
+        for records in batch:
+            conditions = records.get("conditions")
+            if not conditions:
+                continue
+
+            row = race_row(conditions)
+            if row is None:
+                # Course ignorée : un champ critique est nul (même règle que fill_races)
+                continue
+
+            cursor.execute(RACE_INSERT, row)
+            written += cursor.rowcount
+            cursor.execute(
+                "SELECT id FROM races WHERE date = ? AND reunion = ? AND course = ?",
+                (row[0], row[1], row[2])
+            )
+            race_id = cursor.fetchone()[0]
+
+            table_arrive = records.get("table_arrive")
+            if table_arrive:
+                cursor.executemany(RESULT_INSERT, result_rows(table_arrive, race_id))
+
+            tracking = records.get("tracking")
+            if tracking:
+                cursor.executemany(
+                    TRACKING_INSERT,
+                    [tracking_row(entry, race_id) for entry in process_json([tracking])]
+                )
+
+    return written
+
+class DbSink:
+    """
+    Écrivain unique vers courses.db.
+
+    Les scrapers déposent leurs enregistrements avec put() ; un thread dédié les
+    regroupe et écrit plusieurs courses par transaction, ce qui évite que des
+    scrapers concurrents se disputent le verrou SQLite.
+
+    `mode` est le profil de connexion (voir db_connection.PROFILES) : 'shared' pour
+    une base écrite par plusieurs machines via un stockage partagé.
+    """
+    def __init__(self, db_file="courses.db", batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, mode="write"):
+        self.db_file = db_file
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=batch_size * 10)
+        self.thread = threading.Thread(target=self._run, name="db-sink", daemon=True)
+        self.races_written = 0
+        # Première erreur rencontrée par le thread d'écriture, relancée par close()
+        self.error = None
+
+    def start(self):
+        create_tables(self.db_file, mode=self.mode)
+        self.thread.start()
+        return self
+
+    def put(self, records):
+        """
+        Dépose les enregistrements d'une course. Lève l'erreur du thread d'écriture
+        s'il s'est arrêté : la file ne serait plus jamais vidée.
+        """
+        while True:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"Écriture vers {self.db_file} arrêtée") from self.error
+            try:
+                self.queue.put(records, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def close(self):
+        """
+        Vide la file, écrit le dernier lot et attend la fin du thread. Relance la
+        première erreur d'écriture : les lots concernés n'ont pas été enregistrés.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+        self.thread.join()
+        print(f"{self.races_written} courses enregistrées dans {self.db_file}.")
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        try:
+            conn = get_connection(self.db_file, mode=self.mode)
+        except Exception as e:
+            self.error = e
+            return
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        records = self.queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if records is None:
+                        stopping = True
+                        break
+                    batch.append(records)
+
+                if batch:
+                    try:
+                        self.races_written += write_batch(conn, batch)
+                    except Exception as e:
+                        # Le thread continue de vider la file : put() ne doit jamais bloquer
+                        print(f"Erreur lors de l'écriture d'un lot de {len(batch)} courses : {e}")
+                        if self.error is None:
+                            self.error = e
+        finally:
+            conn.close()
@@ -1,169 +1,314 @@
+import argparse
+import time
+
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import lightgbm
 from lightgbm import LGBMRanker
 from sklearn.model_selection import GroupShuffleSplit
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import roc_curve, auc
-
-# --- 1. Chargement et préparation des données ---
-df = pd.read_csv("/content/Donn_es_Nettoy_es.csv")
+from feature_store import FEATURE_STORE_DIR, read_dataset, read_imputation
+from evaluation import evaluate, print_summary, winner_rank_distribution
+from model_store import MODELS_DIR, save_artifact
+from to_db import ENTITY_STAT_COLUMNS
 
-# Convertir la date en datetime
-df['date'] = pd.to_datetime(df['date'])
-
-# Créer la cible binaire : 1 si le cheval a gagné (classement == 1), 0 sinon
-df['is_winner'] = (df['classement'] == 1).astype(int)
-
-# --- 2. Création de nouvelles features ---
-df['ratio_poids_partants'] = df['poids'] / df['nombre_de_partants']
-df['allocation_par_partant'] = df['allocation'] / df['nombre_de_partants']
-df['ratio_podium_races'] = df['horse_podium_rate'] / (df['horse_races'] + 1)  # évite division par 0
-df['vitesse_par_partant'] = df['horse_avg_vmax'] / df['nombre_de_partants']
+# Seules les colonnes utilisées sont lues depuis le jeu Parquet produit par prepa_data.py
+COLUMNS = [
+    'race_id', 'date', 'classement',
+    'nombre_de_partants', 'allocation', 'temperature', 'vent_vitesse', 'poids',
+    'horse_avg_classement', 'horse_std_classement', 'horse_races',
+    'horse_podium_rate', 'horse_avg_vmax', 'day_of_week', 'month', 'year',
+    'hippodrome', 'style', 'race_discipline', 'terrain', 'ciel', 'vent_direction'
+] + ENTITY_STAT_COLUMNS
 
-# --- 3. Sélection des features ---
-numeric_features = [
+# Statistiques par entité (entity_stats.py) : parts de victoires et de podiums du
+# jockey, de l'entraîneur, du couple et du cheval sur l'hippodrome / le terrain
+NUMERIC_FEATURES = [
     'nombre_de_partants', 'allocation', 'temperature', 'vent_vitesse', 'poids',
     'horse_avg_classement', 'horse_std_classement', 'horse_races',
     'horse_podium_rate', 'horse_avg_vmax', 'day_of_week', 'month', 'year',
     'ratio_poids_partants', 'allocation_par_partant', 'ratio_podium_races', 'vitesse_par_partant'
-]
-categorical_features = [
+] + ENTITY_STAT_COLUMNS
+CATEGORICAL_FEATURES = [
     'hippodrome', 'style', 'race_discipline', 'terrain', 'ciel', 'vent_direction'
 ]
 
-group_col = 'race_id'
-target = 'is_winner'
-
-X = df[numeric_features + categorical_features]
-y = df[target]
-groups = df[group_col]
-
-# --- 4. Prétraitement : standardisation et encodage ---
-numeric_transformer = Pipeline(steps=[
-    ('scaler', StandardScaler())
-])
-categorical_transformer = Pipeline(steps=[
-    ('onehot', OneHotEncoder(handle_unknown='ignore'))
-])
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', numeric_transformer, numeric_features),
-        ('cat', categorical_transformer, categorical_features)
-    ]
-)
-
-X_preprocessed = preprocessor.fit_transform(X)
-
-# --- 5. Split par course (GroupShuffleSplit) ---
-splitter = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
-train_idx, test_idx = next(splitter.split(X_preprocessed, y, groups=groups))
-
-X_train, X_test = X_preprocessed[train_idx], X_preprocessed[test_idx]
-y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
-groups_train, groups_test = groups.iloc[train_idx], groups.iloc[test_idx]
-
-# --- 6. Entraînement du modèle de Ranking ---
-# Utilisation de LGBMRanker avec l'objectif 'lambdarank'
-ranker = LGBMRanker(
-    objective='lambdarank',
-    metric='ndcg',
-    boosting_type='gbdt',
-    learning_rate=0.001,
-    num_leaves=50,
-    n_estimators=10000,
-    random_state=42
-)
-
-# Pour le ranking, il faut spécifier la taille de chaque groupe (chaque course)
-train_group = groups_train.value_counts().sort_index().values
-test_group = groups_test.value_counts().sort_index().values
-
-ranker.fit(
-    X_train, y_train,
-    group=train_group,
-    eval_set=[(X_test, y_test)],
-    eval_group=[test_group],
-)
-
-# --- 7. Évaluation par course ---
-# Prédire la probabilité d'être gagnant sur le set test
-y_pred_proba = ranker.predict(X_test)
-
-# Reconstruction d'un DataFrame d'évaluation incluant le groupement
-test_df = pd.DataFrame({
-    'race_id': groups_test.values,
-    'y_true': y_test.values,
-    'pred_proba': y_pred_proba
-})
-
-# Fonction pour vérifier si le cheval avec la plus forte probabilité est bien le vrai gagnant
-def check_correct_winner(group):
-    idx_max = group['pred_proba'].idxmax()
-    return 1 if group.loc[idx_max, 'y_true'] == 1 else 0
-
-winner_accuracy = test_df.groupby('race_id', group_keys=False).apply(check_correct_winner).mean()
-print(f"Taux de réussite pour prédire le vainqueur (top-1) par course : {winner_accuracy:.3f}")
-
-# --- 8. Analyse des erreurs : Calcul et visualisation de l'écart (gap) ---
-def compute_error_gap(group):
-    # Probabilité prédite pour le cheval sélectionné
-    idx_max = group['pred_proba'].idxmax()
-    pred_top = group.loc[idx_max, 'pred_proba']
-    # Probabilité prédite pour le vrai gagnant (il doit y avoir une seule ligne avec y_true==1)
-    true_winner = group[group['y_true'] == 1]
-    if not true_winner.empty:
-        true_prob = true_winner['pred_proba'].values[0]
+GROUP_COL = 'race_id'
+TARGET = 'is_winner'
+
+# Modes d'entraînement :
+# - 'onehot' : standardisation + one-hot (ColumnTransformer), paramètres d'origine,
+#   sans arrêt anticipé : les n_estimators arbres, appris sur tout le jeu d'entraînement ;
+# - 'native' : catégories passées telles quelles à LightGBM (une seule colonne par
+#   variable, quel que soit le nombre d'hippodromes). Pas d'apprentissage plus grand,
+#   arbres plus petits et feuilles plus peuplées : l'arrêt anticipé fixe le nombre d'arbres.
+MODES = {
+    'onehot': {'learning_rate': 0.001, 'n_estimators': 10000, 'num_leaves': 50},
+    'native': {'learning_rate': 0.05, 'n_estimators': 5000, 'num_leaves': 15, 'min_child_samples': 200},
+}
+DEFAULT_MODE = 'native'
+# Arrêt si le NDCG@1 de validation ne progresse plus pendant ce nombre d'itérations
+# (0 : pas d'arrêt anticipé ni de jeu de validation)
+EARLY_STOPPING_ROUNDS = {'onehot': 0, 'native': 200}
+
+# --- 1. Chargement et préparation des données ---
+def add_features(df):
+    """Cible binaire et features dérivées, sur place."""
+    # Créer la cible binaire : 1 si le cheval a gagné (classement == 1), 0 sinon
+    if 'classement' in df.columns:
+        df[TARGET] = (df['classement'] == 1).astype(int)
+
+    # --- 2. Création de nouvelles features ---
+    df['ratio_poids_partants'] = df['poids'] / df['nombre_de_partants']
+    df['allocation_par_partant'] = df['allocation'] / df['nombre_de_partants']
+    df['ratio_podium_races'] = df['horse_podium_rate'] / (df['horse_races'] + 1)  # évite division par 0
+    df['vitesse_par_partant'] = df['horse_avg_vmax'] / df['nombre_de_partants']
+    return df
+
+def load_training_data(root=FEATURE_STORE_DIR):
+    # Types déclarés dans dataset_schema.py (catégories, entiers réduits, date en datetime64)
+    return add_features(read_dataset(root, columns=COLUMNS))
+
+# --- 3. Split par course (GroupShuffleSplit) ---
+def split_by_race(df, test_size=0.2, random_state=42):
+    """
+    Sépare `df` par course. Chaque partie est triée par course : LightGBM attend
+    les partants d'une même course sur des lignes contiguës.
+    """
+    splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+    train_idx, test_idx = next(splitter.split(df, groups=df[GROUP_COL]))
+    return tuple(
+        df.iloc[idx].sort_values(GROUP_COL, kind='stable').reset_index(drop=True)
+        for idx in (train_idx, test_idx)
+    )
+
+def group_sizes(df):
+    # Pour le ranking, il faut spécifier la taille de chaque groupe (chaque course)
+    return df.groupby(GROUP_COL, sort=True).size().values
+
+# --- 4. Prétraitement ---
+def build_preprocessor(mode):
+    """
+    Standardisation et encodage one-hot en mode 'onehot' ; aucun en mode 'native',
+    où LightGBM lit directement les colonnes 'category' du DataFrame.
+    """
+    if mode == 'native':
+        return None
+    numeric_transformer = Pipeline(steps=[
+        ('scaler', StandardScaler())
+    ])
+    categorical_transformer = Pipeline(steps=[
+        ('onehot', OneHotEncoder(handle_unknown='ignore'))
+    ])
+    return ColumnTransformer(
+        transformers=[
+            ('num', numeric_transformer, NUMERIC_FEATURES),
+            ('cat', categorical_transformer, CATEGORICAL_FEATURES)
+        ]
+    )
+
+def transform(preprocessor, df):
+    X = df[NUMERIC_FEATURES + CATEGORICAL_FEATURES]
+    return X if preprocessor is None else preprocessor.transform(X)
+
+# --- 5. Entraînement du modèle de Ranking ---
+def train_ranker(train_df, mode=DEFAULT_MODE, n_jobs=-1, early_stopping_rounds=None,
+                 learning_rate=None, n_estimators=None, valid_size=0.1, random_state=42):
+    """
+    Entraîne un LGBMRanker (objectif 'lambdarank') sur `train_df`.
+
+    Avec l'arrêt anticipé sur le NDCG@1 (`early_stopping_rounds`, par défaut celui du
+    mode dans EARLY_STOPPING_ROUNDS), une partie des courses de `train_df` (`valid_size`)
+    sert de jeu de validation. Avec 0, les `n_estimators` arbres sont appris sur tout
+    `train_df`. `n_jobs` fixe le nombre de threads (-1 : tous).
+    Retourne (preprocessor, ranker, durée de l'entraînement en secondes).
+    """
+    params = dict(MODES[mode])
+    if learning_rate is not None:
+        params['learning_rate'] = learning_rate
+    if n_estimators is not None:
+        params['n_estimators'] = n_estimators
+    if early_stopping_rounds is None:
+        early_stopping_rounds = EARLY_STOPPING_ROUNDS[mode]
+
+    if early_stopping_rounds:
+        fit_df, valid_df = split_by_race(train_df, valid_size, random_state)
     else:
-        true_prob = np.nan
-    return pred_top - true_prob
-
-# Calculer l'écart pour chaque course
-error_gaps = test_df.groupby('race_id').apply(compute_error_gap)
-
-# Filtrer uniquement les courses mal évaluées (écart > 0 signifie que le modèle a préféré un autre cheval)
-misclassified_gaps = error_gaps[error_gaps > 0]
-
-plt.figure(figsize=(10, 6))
-sns.histplot(misclassified_gaps, bins=30, kde=True, color="orange")
-plt.xlabel("Écart de prédiction (Gap)")
-plt.ylabel("Nombre de courses")
-plt.title("Distribution de l'écart de prédiction pour les courses mal évaluées")
-plt.show()
-
-# --- 9. Autres visualisations ---
-
-# Histogramme des probabilités prédites pour les gagnants et non-gagnants
-plt.figure(figsize=(12, 5))
-sns.histplot(test_df[test_df['y_true'] == 1]['pred_proba'], label="Gagnants", color="green", bins=50, kde=True)
-sns.histplot(test_df[test_df['y_true'] == 0]['pred_proba'], label="Non-gagnants", color="red", bins=50, kde=True)
-plt.xlabel("Probabilité prédite")
-plt.ylabel("Nombre de chevaux")
-plt.legend()
-plt.title("Distribution des probabilités prédites")
-plt.show()
-
-# Courbe ROC
-fpr, tpr, _ = roc_curve(y_test, y_pred_proba)
-roc_auc = auc(fpr, tpr)
-plt.figure(figsize=(8, 6))
-plt.plot(fpr, tpr, color='blue', lw=2, label=f'ROC curve (area = {roc_auc:.2f})')
-plt.plot([0, 1], [0, 1], color='grey', linestyle='--')
-plt.xlabel('Taux de faux positifs')
-plt.ylabel('Taux de vrais positifs')
-plt.title('Courbe ROC')
-plt.legend(loc="lower right")
-plt.show()
-
-# Comparaison sous forme de barplot : Pourcentage de courses correctement vs. mal prédites
-correct_preds = test_df.groupby('race_id', group_keys=False).apply(check_correct_winner)
-plt.figure(figsize=(6, 4))
-sns.barplot(x=['Mauvaises Prédictions', 'Bonnes Prédictions'],
-            y=[(1 - correct_preds.mean()), correct_preds.mean()],
-            palette="Blues_d")
-plt.ylabel("Proportion")
-plt.title("Précision de la prédiction du vainqueur par course")
-plt.show()
+        fit_df, valid_df = train_df, None
+    preprocessor = build_preprocessor(mode)
+    if preprocessor is not None:
+        preprocessor.fit(fit_df[NUMERIC_FEATURES + CATEGORICAL_FEATURES])
+
+    # Utilisation de LGBMRanker avec l'objectif 'lambdarank'
+    ranker = LGBMRanker(
+        objective='lambdarank',
+        metric='ndcg',
+        boosting_type='gbdt',
+        random_state=42,
+        n_jobs=n_jobs,
+        verbose=-1,
+        **params
+    )
+
+    evaluation = {}
+    callbacks = []
+    if valid_df is not None:
+        evaluation = {
+            'eval_set': [(transform(preprocessor, valid_df), valid_df[TARGET])],
+            'eval_group': [group_sizes(valid_df)],
+            'eval_at': [1, 3, 5],
+        }
+        callbacks = [
+            lightgbm.log_evaluation(period=100),
+            lightgbm.early_stopping(early_stopping_rounds, first_metric_only=True, verbose=False),
+        ]
+
+    start = time.perf_counter()
+    ranker.fit(
+        transform(preprocessor, fit_df), fit_df[TARGET],
+        group=group_sizes(fit_df),
+        callbacks=callbacks,
+        **evaluation
+    )
+    elapsed = time.perf_counter() - start
+
+    best = ranker.best_iteration_ or params['n_estimators']
+    print(f"Entraînement ({mode}) : {elapsed:.1f} s, {best} arbres retenus, "
+          f"{transform(preprocessor, fit_df.head(1)).shape[1]} colonnes en entrée.")
+    return preprocessor, ranker, elapsed
+
+def score(preprocessor, ranker, df):
+    """Score de chaque partant de `df` (plus élevé = plus de chances de gagner)."""
+    return ranker.predict(transform(preprocessor, df))
+
+# --- 6. Évaluation par course ---
+def evaluate_ranker(preprocessor, ranker, test_df):
+    # Prédire la probabilité d'être gagnant sur le set test
+    test_df = pd.DataFrame({
+        'race_id': test_df[GROUP_COL].values,
+        'y_true': test_df[TARGET].values,
+        'pred_proba': score(preprocessor, ranker, test_df)
+    })
+
+    # Métriques par course (top-1, top-k, NDCG@k, rang du gagnant, écart) : voir evaluation.py
+    summary, per_race = evaluate(test_df['race_id'], test_df['pred_proba'], test_df['y_true'])
+    print_summary(summary)
+    print("Rang prédit du gagnant (part des courses) :")
+    print(winner_rank_distribution(per_race).head(10).to_string())
+    return test_df, summary, per_race
+
+# --- 7. Visualisations ---
+def plot_evaluation(test_df, summary, per_race):
+    # Importés ici : predict.py réutilise ce module sans les graphiques
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.metrics import roc_curve, auc
+
+    # Analyse des erreurs : écart entre la probabilité du cheval sélectionné et celle du vrai gagnant
+    error_gaps = per_race['gap']
+
+    # Filtrer uniquement les courses mal évaluées (écart > 0 signifie que le modèle a préféré un autre cheval)
+    misclassified_gaps = error_gaps[error_gaps > 0]
+
+    plt.figure(figsize=(10, 6))
+    sns.histplot(misclassified_gaps, bins=30, kde=True, color="orange")
+    plt.xlabel("Écart de prédiction (Gap)")
+    plt.ylabel("Nombre de courses")
+    plt.title("Distribution de l'écart de prédiction pour les courses mal évaluées")
+    plt.show()
+
+    # Histogramme des probabilités prédites pour les gagnants et non-gagnants
+    plt.figure(figsize=(12, 5))
+    sns.histplot(test_df[test_df['y_true'] == 1]['pred_proba'], label="Gagnants", color="green", bins=50, kde=True)
+    sns.histplot(test_df[test_df['y_true'] == 0]['pred_proba'], label="Non-gagnants", color="red", bins=50, kde=True)
+    plt.xlabel("Probabilité prédite")
+    plt.ylabel("Nombre de chevaux")
+    plt.legend()
+    plt.title("Distribution des probabilités prédites")
+    plt.show()
+
+    # Courbe ROC
+    fpr, tpr, _ = roc_curve(test_df['y_true'], test_df['pred_proba'])
+    roc_auc = auc(fpr, tpr)
+    plt.figure(figsize=(8, 6))
+    plt.plot(fpr, tpr, color='blue', lw=2, label=f'ROC curve (area = {roc_auc:.2f})')
+    plt.plot([0, 1], [0, 1], color='grey', linestyle='--')
+    plt.xlabel('Taux de faux positifs')
+    plt.ylabel('Taux de vrais positifs')
+    plt.title('Courbe ROC')
+    plt.legend(loc="lower right")
+    plt.show()
+
+    # Comparaison sous forme de barplot : Pourcentage de courses correctement vs. mal prédites
+    plt.figure(figsize=(6, 4))
+    sns.barplot(x=['Mauvaises Prédictions', 'Bonnes Prédictions'],
+                y=[(1 - summary['top1']), summary['top1']],
+                palette="Blues_d")
+    plt.ylabel("Proportion")
+    plt.title("Précision de la prédiction du vainqueur par course")
+    plt.show()
+
+# --- 8. Sauvegarde ---
+def build_artifact(preprocessor, ranker, mode, root, train_df, summary, train_seconds):
+    """
+    Tout ce qu'il faut pour noter de nouveaux partants sans réentraîner (voir predict.py) :
+    prétraitement ajusté, modèle, listes de features et médianes d'imputation de prepa_data.py.
+    """
+    return {
+        'mode': mode,
+        'numeric_features': NUMERIC_FEATURES,
+        'categorical_features': CATEGORICAL_FEATURES,
+        'preprocessor': preprocessor,
+        'ranker': ranker,
+        'medians': read_imputation(root),
+        'metrics': summary,
+        'training': {
+            'rows': len(train_df),
+            'races': int(train_df[GROUP_COL].nunique()),
+            'first_date': str(train_df['date'].min().date()),
+            'last_date': str(train_df['date'].max().date()),
+            'best_iteration': ranker.best_iteration_ or ranker.n_estimators,
+            'seconds': round(train_seconds, 1),
+        },
+    }
+
+def main(root=FEATURE_STORE_DIR, mode=DEFAULT_MODE, n_jobs=-1, early_stopping_rounds=None,
+         learning_rate=None, n_estimators=None, plots=True, models_dir=MODELS_DIR):
+    df = load_training_data(root)
+    train_df, test_df = split_by_race(df)
+    preprocessor, ranker, train_seconds = train_ranker(
+        train_df, mode, n_jobs, early_stopping_rounds, learning_rate, n_estimators
+    )
+    results = evaluate_ranker(preprocessor, ranker, test_df)
+
+    if models_dir:
+        path = save_artifact(
+            build_artifact(preprocessor, ranker, mode, root, train_df, results[1], train_seconds), models_dir
+        )
+        print(f"Modèle enregistré dans {path}")
+
+    if plots:
+        plot_evaluation(*results)
+    return preprocessor, ranker
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entraînement et évaluation du LGBMRanker")
+    parser.add_argument("--root", default=FEATURE_STORE_DIR, help="Jeu Parquet produit par prepa_data.py")
+    parser.add_argument("--mode", choices=sorted(MODES), default=DEFAULT_MODE,
+                        help="'native' : catégories natives LightGBM ; 'onehot' : encodage d'origine")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Nombre de threads LightGBM (-1 : tous)")
+    parser.add_argument("--early-stopping-rounds", type=int, default=None,
+                        help="Arrêt anticipé sur 10 %% des courses d'entraînement (0 : désactivé, "
+                             "tout l'entraînement sert à l'apprentissage ; par défaut "
+                             + ", ".join(f"{m} : {r}" for m, r in sorted(EARLY_STOPPING_ROUNDS.items())) + ")")
+    parser.add_argument("--learning-rate", type=float)
+    parser.add_argument("--n-estimators", type=int)
+    parser.add_argument("--no-plots", action="store_true")
+    parser.add_argument("--models-dir", default=MODELS_DIR, help="Dossier des modèles enregistrés")
+    parser.add_argument("--no-save", action="store_true", help="N'enregistre pas le modèle")
+    args = parser.parse_args()
+
+    main(args.root, args.mode, args.n_jobs, args.early_stopping_rounds,
+         args.learning_rate, args.n_estimators, plots=not args.no_plots,
+         models_dir=None if args.no_save else args.models_dir)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import pandas as pd
+
+from db_connection import get_connection
+from horse_features import max_versions, prior_totals, read_watermarks, save_watermarks, sql_rows
+
+# Clés de chaque entité (mêmes noms que to_db.ENTITY_STATS) : la première est une colonne de 'results' (indexée),
+# qui sert à relire l'historique des seules clés concernées
+ENTITY_KEYS = {
+    "jockey": ["res.jockey"],
+    "entraineur": ["res.entraineur"],
+    "jockey_entraineur": ["res.jockey", "res.entraineur"],
+    "cheval_hippodrome": ["res.cheval", "r.hippodrome"],
+    "cheval_terrain": ["res.cheval", "r.terrain"],
+}
+
+# Sommes par clé (table entity_state)
+STATE_COLS = ["starts", "wins", "podiums"]
+STAT_NAMES = ["starts", "win_rate", "podium_rate"]
+WATERMARK_PREFIX = "entity_stats"
+
+STATE_INSERT = f'''
+    INSERT INTO entity_state (entity, key1, key2, last_date, {", ".join(STATE_COLS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(entity, key1, key2) DO UPDATE SET
+        last_date = excluded.last_date,
+        {", ".join(f"{col} = excluded.{col}" for col in STATE_COLS)}
+'''
+
+def stat_columns(entity):
+    return [f"{entity}_{stat}" for stat in STAT_NAMES]
+
+def feature_insert(entity):
+    """Upsert des seules colonnes de `entity` dans runner_entity_stats."""
+    columns = stat_columns(entity)
+    return f'''
+        INSERT INTO runner_entity_stats (race_id, numero, {", ".join(columns)})
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(race_id, numero) DO UPDATE SET
+            {", ".join(f"{col} = excluded.{col}" for col in columns)}
+    '''
+
+def key_expressions(entity):
+    """Expressions SQL de key1 et key2 ('' pour une entité à une seule clé)."""
+    key1, *rest = ENTITY_KEYS[entity]
+    return key1, rest[0] if rest else "''"
+
+def runs_query(entity, source="results res"):
+    """
+    Courses d'une entité : une ligne par résultat dont les clés sont connues (ni
+    nulles ni vides : une page sans jockey ne doit pas regrouper ses partants sous
+    une même clé ''), avec les clés renommées key1 / key2.
+    """
+    key1, key2 = key_expressions(entity)
+    known = " AND ".join(f"TRIM({key}) <> ''" for key in ENTITY_KEYS[entity])
+    return f'''
+        SELECT res.race_id, res.numero, {key1} AS key1, {key2} AS key2, r.date, res.classement
+        FROM {source}
+        JOIN races r ON r.id = res.race_id
+        WHERE {known}
+    '''
+
+def run_sums(runs):
+    """Contribution de chaque course aux sommes de STATE_COLS."""
+    classement = runs["classement"]
+    return pd.DataFrame({
+        "starts": classement.notna(),
+        "wins": classement == 1,
+        "podiums": classement <= 3,
+    }, index=runs.index).astype(float)
+
+def stats_from_totals(totals, entity):
+    """Parts, taux de victoire et de podium (NaN si aucune course antérieure)."""
+    starts = totals["starts"]
+    return pd.DataFrame(dict(zip(stat_columns(entity), [
+        starts.astype("int64"),
+        (totals["wins"] / starts).where(starts > 0),
+        (totals["podiums"] / starts).where(starts > 0),
+    ])), index=totals.index)
+
+def compute_and_write(conn, entity, runs, initial=None):
+    """Calcule les statistiques de `entity` sur `runs` et écrit runner_entity_stats et entity_state."""
+    if runs.empty:
+        return 0
+    sums = pd.concat([runs[["key1", "key2", "date"]], run_sums(runs)], axis=1)
+    prior, final = prior_totals(sums, ["key1", "key2"], STATE_COLS, initial)
+
+    conn.executemany(feature_insert(entity), sql_rows(
+        pd.concat([runs[["race_id", "numero"]], stats_from_totals(prior, entity)], axis=1)
+    ))
+    final = final.reset_index()
+    final.insert(0, "entity", entity)
+    conn.executemany(STATE_INSERT, sql_rows(final[["entity", "key1", "key2", "last_date"] + STATE_COLS]))
+    return len(runs)
+
+def rebuild(conn):
+    """Recalcule toutes les statistiques depuis l'historique complet."""
+    marks = max_versions(conn)
+    count = 0
+    with conn:
+        conn.execute("DELETE FROM runner_entity_stats")
+        conn.execute("DELETE FROM entity_state")
+        for entity in ENTITY_KEYS:
+            runs = pd.read_sql_query(runs_query(entity) + " AND res.version <= ?", conn, params=(marks["results"],))
+            count = max(count, compute_and_write(conn, entity, runs))
+        save_watermarks(conn, marks, WATERMARK_PREFIX)
+    return count
+
+def refresh_entity(conn, entity, marks, new_marks):
+    """
+    Met à jour une entité pour les résultats de version dans (marks, new_marks] : même
+    principe que horse_features.refresh, clé par clé (ajout depuis entity_state si
+    les nouvelles courses suivent la dernière course traitée, recalcul sinon).
+    """
+    affected = pd.read_sql_query(
+        f"SELECT key1, key2, MIN(date) AS first_new_date FROM ({runs_query(entity)}"
+        " AND res.version > ? AND res.version <= ?) GROUP BY key1, key2",
+        conn, params=(marks["results"], new_marks["results"])
+    )
+    if affected.empty:
+        return 0
+
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS affected_keys (
+            key1 TEXT NOT NULL, key2 TEXT NOT NULL, since TEXT NOT NULL, PRIMARY KEY (key1, key2)
+        )
+    ''')
+    conn.execute("DELETE FROM affected_keys")
+    conn.executemany("INSERT INTO affected_keys (key1, key2, since) VALUES (?, ?, '')",
+                     affected[["key1", "key2"]].itertuples(index=False))
+
+    state = pd.read_sql_query(f'''
+        SELECT s.key1, s.key2, s.last_date, {", ".join(f"s.{col}" for col in STATE_COLS)}
+        FROM affected_keys a
+        JOIN entity_state s ON s.entity = ? AND s.key1 = a.key1 AND s.key2 = a.key2
+    ''', conn, params=(entity,)).set_index(["key1", "key2"])
+
+    first_new = affected.set_index(["key1", "key2"])["first_new_date"]
+    last_date = state["last_date"].reindex(first_new.index)
+    appendable = last_date.notna() & (first_new > last_date)
+    conn.executemany(
+        "UPDATE affected_keys SET since = ? WHERE key1 = ? AND key2 = ?",
+        [(date, key1, key2) for (key1, key2), date in last_date[appendable].items()]
+    )
+
+    key1, key2 = key_expressions(entity)
+    runs = pd.read_sql_query(
+        runs_query(entity, f"affected_keys a JOIN results res ON {key1} = a.key1")
+        + f" AND {key2} = a.key2 AND r.date > a.since AND res.version <= ?",
+        conn, params=(new_marks["results"],)
+    )
+
+    count = compute_and_write(conn, entity, runs, initial=state[appendable.reindex(state.index, fill_value=False)])
+    print(f"{entity} : {len(affected)} clés mises à jour ({int(appendable.sum())} en ajout, "
+          f"{int((~appendable).sum())} recalculées), {count} partants.")
+    return count
+
+def refresh(conn):
+    """
+    Met à jour les statistiques après l'arrivée de nouveaux résultats, en ne relisant
+    que les clés concernées. Les résultats ajoutés ou corrigés sont repérés par leur
+    numéro de changement ('version'). Sans filigrane (première exécution), tout est
+    recalculé. Une clé corrigée (jockey renommé, ...) reste comptée dans l'ancienne
+    clé, qui n'est pas connue : utiliser rebuild.
+    """
+    marks = read_watermarks(conn, WATERMARK_PREFIX)
+    if marks is None:
+        return rebuild(conn)
+
+    new_marks = max_versions(conn)
+    count = 0
+    with conn:
+        for entity in ENTITY_KEYS:
+            count = max(count, refresh_entity(conn, entity, marks, new_marks))
+        save_watermarks(conn, new_marks, WATERMARK_PREFIX)
+    return count
+
+def lookup(conn, entity, key1, key2=""):
+    """
+    Statistiques courantes d'une clé (toutes les courses traitées), lues par clé
+    primaire dans entity_state : {'<entity>_starts': ..., ...}.
+    """
+    row = conn.execute(
+        f"SELECT {', '.join(STATE_COLS)} FROM entity_state WHERE entity = ? AND key1 = ? AND key2 = ?",
+        (entity, key1, key2)
+    ).fetchone()
+    starts, wins, podiums = row or (0, 0, 0)
+    return dict(zip(stat_columns(entity), [
+        starts,
+        wins / starts if starts else None,
+        podiums / starts if starts else None,
+    ]))
+
+def current_stats(conn, runners):
+    """
+    Statistiques courantes des partants `runners` (colonnes cheval, jockey, entraineur,
+    hippodrome, terrain), pour noter une course à venir : mêmes colonnes que
+    runner_entity_stats, une lecture par clé distincte. Une clé manquante ou vide
+    donne des statistiques nulles, comme dans runner_entity_stats.
+    """
+    columns = {}
+    for entity, keys in ENTITY_KEYS.items():
+        names = [key.split(".", 1)[1] for key in keys]
+        pairs = runners[names].itertuples(index=False, name=None)
+        cache = {}
+        values = []
+        for pair in pairs:
+            if any(pd.isna(value) or not str(value).strip() for value in pair):
+                values.append(dict.fromkeys(stat_columns(entity)))
+                continue
+            if pair not in cache:
+                cache[pair] = lookup(conn, entity, *pair)
+            values.append(cache[pair])
+        columns[entity] = pd.DataFrame(values, index=runners.index, columns=stat_columns(entity))
+    return pd.concat(columns.values(), axis=1)
+
+def refresh_entity_stats(db_file, full=False):
+    conn = get_connection(db_file)
+    try:
+        return rebuild(conn) if full else refresh(conn)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from to_db import create_tables
+
+    parser = argparse.ArgumentParser(description="Statistiques point-in-time par jockey, entraîneur, hippodrome")
+    parser.add_argument("--db", default="courses.db")
+    parser.add_argument("--rebuild", action="store_true", help="Recalcule tout l'historique")
+    args = parser.parse_args()
+
+    create_tables(args.db)
+    start = time.perf_counter()
+    count = refresh_entity_stats(args.db, full=args.rebuild)
+    print(f"{count} partants calculés en {time.perf_counter() - start:.1f} s.")
@@ -1,8 +1,9 @@
 import sqlite3
+from db_connection import get_connection
 
 def delete_all_tables(db_path):
     # Connexion à la base de données
-    conn = sqlite3.connect(db_path)
+    conn = get_connection(db_path)
     cursor = conn.cursor()
     
     try:
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+# Rangs retenus par défaut pour le taux top-k et le NDCG@k
+DEFAULT_KS = (1, 3, 5)
+
+def race_segments(race_ids, scores):
+    """
+    Trie les partants par (course, score décroissant) et découpe le résultat en
+    segments contigus, un par course.
+
+    Retourne :
+    - `order` : permutation qui trie les lignes ;
+    - `starts` : position du premier partant de chaque course dans l'ordre trié ;
+    - `rank` : rang (0 = meilleur score) de chaque ligne triée dans sa course.
+    Le tri est stable : à score égal, l'ordre d'origine est conservé (comme idxmax).
+    """
+    order = np.lexsort((-scores, race_ids))
+    sorted_races = race_ids[order]
+    new_race = np.empty(len(order), dtype=bool)
+    new_race[:1] = True
+    new_race[1:] = sorted_races[1:] != sorted_races[:-1]
+    starts = np.flatnonzero(new_race)
+    segment = np.cumsum(new_race) - 1
+    rank = np.arange(len(order)) - starts[segment]
+    return order, starts, rank
+
+def per_race_metrics(race_ids, scores, y_true, ks=DEFAULT_KS):
+    """
+    Métriques de chaque course, calculées en une passe sur des tableaux NumPy
+    (opérations par segment, sans fonction Python appelée par course).
+
+    `y_true` est la pertinence de chaque partant (1 pour le gagnant, 0 sinon ;
+    une pertinence graduée est acceptée pour le NDCG). Colonnes retournées :
+    - runners : nombre de partants ;
+    - winner_rank : rang (1 = premier) du gagnant le mieux classé, NaN sans gagnant ;
+    - top_score, winner_score, gap : score du premier, du gagnant, et leur écart ;
+    - ndcg@k pour chaque k de `ks` (gain 2^pertinence - 1, comme LightGBM ;
+      1 pour une course sans partant pertinent).
+    """
+    race_ids = np.asarray(race_ids)
+    scores = np.asarray(scores, dtype=np.float64)
+    relevance = np.asarray(y_true, dtype=np.float64)
+    if len(race_ids) == 0:
+        return pd.DataFrame(columns=["runners", "winner_rank", "top_score", "winner_score", "gap"]
+                            + [f"ndcg@{k}" for k in ks])
+
+    order, starts, rank = race_segments(race_ids, scores)
+    scores = scores[order]
+    relevance = relevance[order]
+
+    # Rang du meilleur gagnant : minimum par segment, hors partants non gagnants
+    no_winner = len(order)
+    winner_rank = np.minimum.reduceat(np.where(relevance > 0, rank, no_winner), starts)
+    has_winner = winner_rank < no_winner
+    winner_pos = starts + np.where(has_winner, winner_rank, 0)
+    winner_score = np.where(has_winner, scores[winner_pos], np.nan)
+
+    metrics = {
+        "runners": np.diff(np.append(starts, len(order))),
+        "winner_rank": np.where(has_winner, winner_rank + 1, np.nan),
+        "top_score": scores[starts],
+        "winner_score": winner_score,
+        "gap": scores[starts] - winner_score,
+    }
+
+    # NDCG : même découpage, pertinences triées par ordre décroissant pour l'idéal
+    gain = 2 ** relevance - 1
+    segment = np.repeat(np.arange(len(starts)), metrics["runners"])
+    ideal_gain = gain[np.lexsort((-gain, segment))]
+    discount = 1 / np.log2(rank + 2)
+    for k in ks:
+        cut = np.where(rank < k, discount, 0)
+        dcg = np.add.reduceat(gain * cut, starts)
+        idcg = np.add.reduceat(ideal_gain * cut, starts)
+        metrics[f"ndcg@{k}"] = np.divide(dcg, idcg, out=np.ones_like(dcg), where=idcg > 0)
+
+    return pd.DataFrame(metrics, index=pd.Index(race_ids[order][starts], name="race_id"))
+
+def summarize(per_race, ks=DEFAULT_KS):
+    """
+    Moyennes sur toutes les courses de `per_race` : taux top-k (une course sans
+    gagnant compte comme un échec), NDCG@k et rang moyen du gagnant.
+    """
+    summary = {"races": len(per_race)}
+    for k in ks:
+        summary[f"top{k}"] = float((per_race["winner_rank"] <= k).mean())
+    for k in ks:
+        summary[f"ndcg@{k}"] = float(per_race[f"ndcg@{k}"].mean())
+    summary["mean_winner_rank"] = float(per_race["winner_rank"].mean())
+    return summary
+
+def winner_rank_distribution(per_race):
+    """Part des courses selon le rang prédit du gagnant (NaN : course sans gagnant)."""
+    return per_race["winner_rank"].value_counts(normalize=True, dropna=False).sort_index()
+
+def evaluate(race_ids, scores, y_true, ks=DEFAULT_KS):
+    """Retourne (résumé, métriques par course) : voir summarize et per_race_metrics."""
+    per_race = per_race_metrics(race_ids, scores, y_true, ks)
+    return summarize(per_race, ks), per_race
+
+def print_summary(summary):
+    print(f"{summary['races']} courses évaluées")
+    for name, value in summary.items():
+        if name.startswith("top"):
+            print(f"  Taux de réussite {name} : {value:.3f}")
+        elif name.startswith("ndcg"):
+            print(f"  NDCG{name[4:]} : {value:.3f}")
+    print(f"  Rang moyen du gagnant : {summary['mean_winner_rank']:.2f}")
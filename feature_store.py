@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset_schema import apply_schema
+
+FEATURE_STORE_DIR = "feature_store"
+PARTITION_COLS = ["year", "month"]
+COMPRESSION = "zstd"
+# Médianes d'imputation de prepa_data.py, réutilisées à la prédiction.
+# Préfixe '_' : fichier ignoré par pyarrow à la lecture du dossier
+IMPUTATION_FILE = "_imputation.json"
+
+def write_dataset(df, root=FEATURE_STORE_DIR, overwrite=False):
+    """
+    Écrit le jeu de données préparé en fichiers Parquet typés et compressés,
+    partitionnés par année et par mois (root/year=2024/month=3/...).
+
+    Seules les partitions présentes dans `df` sont remplacées : réécrire un mois
+    ne touche pas aux autres. `overwrite` vide d'abord tout le dossier.
+    """
+    if overwrite and os.path.isdir(root):
+        shutil.rmtree(root)
+
+    missing = [col for col in PARTITION_COLS if col not in df.columns]
+    if missing:
+        df = df.assign(**{col: getattr(df["date"].dt, col) for col in missing})
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_to_dataset(
+        table,
+        root,
+        partition_cols=PARTITION_COLS,
+        compression=COMPRESSION,
+        existing_data_behavior="delete_matching",
+    )
+    return table.num_rows
+
+def read_dataset(root=FEATURE_STORE_DIR, columns=None, filters=None):
+    """
+    Relit le jeu de données en ne chargeant que les colonnes et partitions demandées,
+    avec les types de dataset_schema.py. Les fichiers sont ouverts en mémoire mappée.
+
+    `filters` suit la syntaxe de pyarrow.parquet.read_table, par exemple
+    [("year", ">=", 2023)] ou [("year", "=", 2024), ("month", "in", [1, 2, 3])] :
+    les partitions exclues ne sont pas lues.
+    """
+    table = pq.read_table(root, columns=columns, filters=filters, memory_map=True)
+    # Les colonnes de partition sont relues comme catégories : types de dataset_schema.py
+    return apply_schema(table.to_pandas())
+
+def write_imputation(medians, root=FEATURE_STORE_DIR):
+    """Enregistre à côté du jeu de données les valeurs utilisées pour combler les NaN."""
+    with open(os.path.join(root, IMPUTATION_FILE), "w", encoding="utf-8") as f:
+        json.dump({col: float(value) for col, value in medians.items()}, f, indent=2)
+
+def read_imputation(root=FEATURE_STORE_DIR):
+    """Médianes enregistrées par write_imputation, ou None si absentes."""
+    path = os.path.join(root, IMPUTATION_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def dataset_size(root=FEATURE_STORE_DIR):
+    """Taille sur disque du jeu de données, en octets."""
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for folder, _, files in os.walk(root)
+        for name in files
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Résumé du jeu de données Parquet")
+    parser.add_argument("--root", default=FEATURE_STORE_DIR)
+    args = parser.parse_args()
+
+    df = read_dataset(args.root, columns=PARTITION_COLS)
+    print(f"{len(df)} lignes, {dataset_size(args.root) / 1e6:.1f} Mo sur disque")
+    print(df.groupby(PARTITION_COLS).size().to_string())
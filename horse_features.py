@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_connection import get_connection
+
+# Sommes par cheval dont sont tirés les agrégats (table horse_state)
+STATE_COLS = ["starts", "classement_sum", "classement_sum_sq", "podiums", "vmax_sum", "vmax_count"]
+FEATURE_COLS = [
+    "horse_races", "horse_avg_classement", "horse_std_classement",
+    "horse_podium_rate", "horse_avg_vmax",
+]
+
+WATERMARKS = ("results", "tracking")
+
+# Courses d'un partant : une ligne par résultat, avec la vitesse max du tracking si connue.
+# {source} est 'results res', éventuellement restreint par une jointure
+RUNS_SELECT = '''
+    SELECT res.race_id, res.numero, res.cheval, r.date, res.classement, t.vitessemax_kmh
+    FROM {source}
+    JOIN races r ON r.id = res.race_id
+    LEFT JOIN tracking t ON t.race_id = res.race_id AND t.numero = res.numero
+'''
+
+FEATURE_INSERT = f'''
+    INSERT INTO horse_features (race_id, numero, cheval, date, {", ".join(FEATURE_COLS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(race_id, numero) DO UPDATE SET
+        cheval = excluded.cheval,
+        date = excluded.date,
+        {", ".join(f"{col} = excluded.{col}" for col in FEATURE_COLS)}
+'''
+
+STATE_INSERT = f'''
+    INSERT INTO horse_state (cheval, last_date, {", ".join(STATE_COLS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(cheval) DO UPDATE SET
+        last_date = excluded.last_date,
+        {", ".join(f"{col} = excluded.{col}" for col in STATE_COLS)}
+'''
+
+def run_sums(runs):
+    """Contribution de chaque course aux sommes de STATE_COLS."""
+    classement = runs["classement"]
+    vmax = runs["vitessemax_kmh"]
+    return pd.DataFrame({
+        "starts": classement.notna(),
+        "classement_sum": classement.fillna(0),
+        "classement_sum_sq": classement.fillna(0) ** 2,
+        "podiums": classement <= 3,
+        "vmax_sum": vmax.fillna(0),
+        "vmax_count": vmax.notna(),
+    }, index=runs.index).astype(float)
+
+def prior_totals(runs, keys, sum_cols, initial=None):
+    """
+    Sommes cumulées point-in-time, en une passe vectorisée triée par (clé, date).
+
+    `runs` contient une ligne par partant avec les colonnes `keys`, 'date' et `sum_cols`.
+    Retourne :
+    - pour chaque ligne de `runs`, les sommes sur les dates strictement antérieures
+      (une course du même jour n'est jamais comptée) ;
+    - par clé, les sommes finales et la dernière date ('last_date').
+    `initial` (indexé par `keys`) donne les sommes déjà acquises avant la première
+    date de `runs`, pour une mise à jour incrémentale.
+    """
+    daily = runs.groupby(keys + ["date"], sort=True)[sum_cols].sum()
+    cumulative = daily.groupby(level=keys, sort=False).cumsum()
+    if initial is not None and len(initial):
+        offset = initial[sum_cols].reindex(daily.index.droplevel("date")).fillna(0).to_numpy()
+        cumulative = cumulative + offset
+    prior = cumulative - daily
+
+    final = cumulative.groupby(level=keys, sort=False).last()
+    dates = pd.Series(daily.index.get_level_values("date"), index=daily.index.droplevel("date"))
+    final["last_date"] = dates.groupby(level=keys, sort=False).max()
+
+    per_run = runs[keys + ["date"]].join(prior, on=keys + ["date"])[sum_cols]
+    return per_run, final
+
+def features_from_totals(totals):
+    """Agrégats d'un cheval à partir de ses sommes (NaN si aucune course antérieure)."""
+    starts = totals["starts"]
+    # Variance d'échantillon (ddof=1) : indéfinie avant la deuxième course
+    variance = (totals["classement_sum_sq"] - totals["classement_sum"] ** 2 / starts) / (starts - 1)
+    return pd.DataFrame({
+        "horse_races": starts.astype("int64"),
+        "horse_avg_classement": (totals["classement_sum"] / starts).where(starts > 0),
+        "horse_std_classement": np.sqrt(variance.clip(lower=0)).where(starts > 1),
+        "horse_podium_rate": (totals["podiums"] / starts).where(starts > 0),
+        "horse_avg_vmax": (totals["vmax_sum"] / totals["vmax_count"]).where(totals["vmax_count"] > 0),
+    }, index=totals.index)
+
+def sql_rows(df):
+    """Tuples prêts pour executemany, avec None à la place des NaN."""
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+def compute_and_write(conn, runs, initial=None):
+    """Calcule les agrégats des courses `runs` et écrit horse_features et horse_state."""
+    if runs.empty:
+        return 0
+    sums = pd.concat([runs[["cheval", "date"]], run_sums(runs)], axis=1)
+    prior, final = prior_totals(sums, ["cheval"], STATE_COLS, initial)
+    features = features_from_totals(prior)
+
+    conn.executemany(FEATURE_INSERT, sql_rows(
+        pd.concat([runs[["race_id", "numero", "cheval", "date"]], features], axis=1)
+    ))
+    final = final.reset_index()
+    conn.executemany(STATE_INSERT, sql_rows(final[["cheval", "last_date"] + STATE_COLS]))
+    return len(runs)
+
+def max_versions(conn):
+    """Dernier numéro de changement ('version') de chaque table de WATERMARKS."""
+    return {table: conn.execute(f"SELECT COALESCE(MAX(version), 0) FROM {table}").fetchone()[0]
+            for table in WATERMARKS}
+
+def read_watermarks(conn, prefix="horse_features"):
+    cursor = conn.execute(
+        "SELECT source, last_id FROM feature_watermarks WHERE source LIKE ?", (f"{prefix}:%",)
+    )
+    marks = {source.split(":", 1)[1]: last_id for source, last_id in cursor}
+    return marks if all(table in marks for table in WATERMARKS) else None
+
+def save_watermarks(conn, marks, prefix="horse_features"):
+    conn.executemany('''
+        INSERT INTO feature_watermarks (source, last_id, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(source) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at
+    ''', [(f"{prefix}:{table}", last_id, datetime.now().isoformat(timespec="seconds"))
+          for table, last_id in marks.items()])
+
+def rebuild(conn):
+    """Recalcule tous les agrégats depuis l'historique complet."""
+    marks = max_versions(conn)
+    runs = pd.read_sql_query(
+        RUNS_SELECT.format(source="results res") + " WHERE res.version <= ?", conn, params=(marks["results"],)
+    )
+    with conn:
+        conn.execute("DELETE FROM horse_features")
+        conn.execute("DELETE FROM horse_state")
+        count = compute_and_write(conn, runs)
+        save_watermarks(conn, marks)
+    return count
+
+def refresh(conn):
+    """
+    Met à jour les agrégats après l'arrivée de nouveaux résultats ou tracking, en ne
+    relisant que les chevaux concernés : O(nouveaux partants) pour une journée ajoutée.
+
+    - cheval dont les nouvelles courses sont postérieures à sa dernière course traitée :
+      seules ces courses sont calculées, en partant des sommes de horse_state ;
+    - sinon (course ancienne ajoutée, tracking arrivé après le résultat) : l'historique
+      du cheval est recalculé entièrement.
+    Les lignes ajoutées ou modifiées sont repérées par leur numéro de changement
+    ('version', voir table_arrive_to_db.RESULT_INSERT) : une correction de résultat est
+    prise en compte, y compris pour le cheval auquel la course était attribuée.
+    Sans filigrane (première exécution), tout est recalculé.
+    """
+    marks = read_watermarks(conn)
+    if marks is None:
+        return rebuild(conn)
+
+    new_marks = max_versions(conn)
+    # Chevaux des partants modifiés, et cheval précédemment associé à ces partants
+    # (horse_features) si la correction porte sur le nom du cheval
+    affected = pd.read_sql_query('''
+        WITH new_runs AS (
+            SELECT race_id, numero FROM results WHERE version > ? AND version <= ?
+            UNION
+            SELECT race_id, numero FROM tracking WHERE version > ? AND version <= ?
+        )
+        SELECT cheval, MIN(date) AS first_new_date FROM (
+            SELECT res.cheval, r.date
+            FROM new_runs
+            JOIN results res ON res.race_id = new_runs.race_id AND res.numero = new_runs.numero
+            JOIN races r ON r.id = res.race_id
+            UNION ALL
+            SELECT hf.cheval, hf.date
+            FROM new_runs
+            JOIN horse_features hf ON hf.race_id = new_runs.race_id AND hf.numero = new_runs.numero
+        )
+        WHERE cheval IS NOT NULL
+        GROUP BY cheval
+    ''', conn, params=(marks["results"], new_marks["results"], marks["tracking"], new_marks["tracking"]))
+    if affected.empty:
+        save_watermarks(conn, new_marks)
+        conn.commit()
+        return 0
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS affected_horses (cheval TEXT PRIMARY KEY, since TEXT NOT NULL)")
+    conn.execute("DELETE FROM affected_horses")
+    conn.executemany("INSERT INTO affected_horses (cheval, since) VALUES (?, '')", affected[["cheval"]].itertuples(index=False))
+
+    state = pd.read_sql_query(f'''
+        SELECT s.cheval, s.last_date, {", ".join(f"s.{col}" for col in STATE_COLS)}
+        FROM horse_state s JOIN affected_horses a ON a.cheval = s.cheval
+    ''', conn).set_index("cheval")
+
+    # Chevaux dont toutes les nouvelles courses suivent la dernière course traitée
+    first_new = affected.set_index("cheval")["first_new_date"]
+    last_date = state["last_date"].reindex(first_new.index)
+    appendable = last_date.notna() & (first_new > last_date)
+    conn.executemany(
+        "UPDATE affected_horses SET since = ? WHERE cheval = ?",
+        [(date, cheval) for cheval, date in last_date[appendable].items()]
+    )
+
+    runs = pd.read_sql_query(
+        RUNS_SELECT.format(source="affected_horses a JOIN results res ON res.cheval = a.cheval")
+        + " WHERE r.date > a.since AND res.version <= ?", conn, params=(new_marks["results"],)
+    )
+
+    with conn:
+        # Les sommes des chevaux recalculés sont remplacées (un cheval peut ne plus
+        # avoir de course après une correction)
+        conn.execute("DELETE FROM horse_state WHERE cheval IN (SELECT cheval FROM affected_horses WHERE since = '')")
+        count = compute_and_write(conn, runs, initial=state[appendable.reindex(state.index, fill_value=False)])
+        save_watermarks(conn, new_marks)
+    print(f"{len(affected)} chevaux mis à jour ({int(appendable.sum())} en ajout, "
+          f"{int((~appendable).sum())} recalculés), {count} partants.")
+    return count
+
+def current_features(conn, chevaux):
+    """
+    Agrégats de chaque cheval pour sa prochaine course, tirés de ses sommes dans
+    horse_state (lecture par clé primaire) : toutes les courses traitées sont
+    antérieures. Un cheval inconnu a 0 course et des agrégats NaN.
+    """
+    chevaux = pd.Index(chevaux).dropna().unique()
+    placeholders = ", ".join("?" for _ in chevaux)
+    state = pd.read_sql_query(
+        f"SELECT cheval, {', '.join(STATE_COLS)} FROM horse_state WHERE cheval IN ({placeholders})",
+        conn, params=list(chevaux)
+    ).set_index("cheval")
+    totals = state.reindex(chevaux).fillna(0)
+    return features_from_totals(totals)
+
+def refresh_horse_features(db_file, full=False):
+    conn = get_connection(db_file)
+    try:
+        return rebuild(conn) if full else refresh(conn)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from to_db import create_tables
+
+    parser = argparse.ArgumentParser(description="Agrégats point-in-time par cheval")
+    parser.add_argument("--db", default="courses.db")
+    parser.add_argument("--rebuild", action="store_true", help="Recalcule tout l'historique")
+    args = parser.parse_args()
+
+    create_tables(args.db)
+    start = time.perf_counter()
+    count = refresh_horse_features(args.db, full=args.rebuild)
+    print(f"{count} partants calculés en {time.perf_counter() - start:.1f} s.")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date as date_cls, datetime
+
+from scrapper_launcher import (
+    DEFAULT_WORKERS, DEFAULT_PER_HOST, HostLimiter,
+    scrape_list, scrape_race, write_race, races_from_list, iter_dates,
+)
+from scrapper_page import configure_cache, configure_http, CACHE_DIR
+from db_sink import DbSink
+from db_connection import get_connection
+
+QUEUE_FILE = "jobs.db"
+DEFAULT_LEASE = 300  # secondes
+DEFAULT_MAX_ATTEMPTS = 3
+POLL_INTERVAL = 5  # secondes
+
+# Deux types de tâches : 'programme' (liste des réunions d'une date, qui crée les
+# tâches de ses courses) et 'course' (les trois extracteurs d'une course).
+PROGRAMME = "programme"
+COURSE = "course"
+
+def open_queue(queue_file=QUEUE_FILE):
+    """
+    Ouvre la file de tâches partagée. Le profil 'shared' (journal d'annulation, pas
+    de WAL) et le délai d'attente sur verrou permettent à plusieurs processus, ou
+    machines partageant le stockage, de l'utiliser en même temps ; chaque
+    réservation se fait dans une transaction BEGIN IMMEDIATE.
+    """
+    conn = get_connection(queue_file, mode="shared", timeout=60, isolation_level=None)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            kind TEXT NOT NULL,
+            date TEXT NOT NULL,
+            reunion TEXT NOT NULL DEFAULT '',
+            course TEXT NOT NULL DEFAULT '',
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            last_error TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (kind, date, reunion, course)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, date)")
+    return conn
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def enqueue(conn, kind, jobs):
+    """Ajoute des tâches (date, reunion, course) ; les tâches déjà connues sont ignorées."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO jobs (kind, date, reunion, course, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(kind, date, reunion, course, _now()) for date, reunion, course in jobs]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def seed(conn, start_date, end_date=None):
+    """
+    Crée une tâche 'programme' par date ; les tâches 'course' sont créées par les workers.
+    Le programme d'une date n'est réservé qu'une fois la date passée (voir claim).
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now()
+    dates = list(iter_dates(start, end))
+    enqueue(conn, PROGRAMME, [(date, "", "") for date in dates])
+    return len(dates)
+
+def claim(conn, worker_id, limit, lease=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Réserve jusqu'à `limit` tâches pour `worker_id` pendant `lease` secondes.
+    Une tâche dont le bail a expiré (worker arrêté) redevient réservable.
+    Les courses passent avant les programmes pour terminer une date avant d'en ouvrir d'autres.
+
+    Le programme d'une date n'est réservé qu'à partir du lendemain : le jour même, la
+    liste ne contient que les courses déjà arrivées et la tâche serait terminée sans
+    les suivantes (même règle que race_calendar.known_meetings).
+    """
+    now = time.time()
+    today = date_cls.today().isoformat()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Bail expiré sans essai restant : la tâche est abandonnée
+        conn.execute('''
+            UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL,
+                last_error = 'bail expiré', updated_at = ?
+            WHERE status = 'running' AND lease_expires < ? AND attempts >= ?
+        ''', (_now(), now, max_attempts))
+        jobs = conn.execute('''
+            SELECT kind, date, reunion, course FROM jobs
+            WHERE attempts < ?
+              AND (status = 'pending' OR (status = 'running' AND lease_expires < ?))
+              AND (kind != 'programme' OR date < ?)
+            ORDER BY kind = 'programme', date, reunion, course
+            LIMIT ?
+        ''', (max_attempts, now, today, limit)).fetchall()
+        conn.executemany('''
+            UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                lease_owner = ?, lease_expires = ?, updated_at = ?
+            WHERE kind = ? AND date = ? AND reunion = ? AND course = ?
+        ''', [(worker_id, now + lease, _now(), *job) for job in jobs])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return jobs
+
+def finish(conn, job, worker_id, error=None, max_attempts=DEFAULT_MAX_ATTEMPTS, exhausted="failed"):
+    """
+    Termine une tâche réservée par `worker_id` : 'done' en cas de succès, sinon retour
+    en 'pending' (ou `exhausted` une fois les essais épuisés). Sans effet si le bail a
+    été repris par un autre worker entre-temps.
+    """
+    if error is None:
+        status_sql = "'done'"
+    else:
+        status_sql = f"CASE WHEN attempts >= {int(max_attempts)} THEN '{exhausted}' ELSE 'pending' END"
+    conn.execute(f'''
+        UPDATE jobs SET status = {status_sql}, lease_owner = NULL, lease_expires = NULL,
+            last_error = ?, updated_at = ?
+        WHERE kind = ? AND date = ? AND reunion = ? AND course = ?
+          AND status = 'running' AND lease_owner = ?
+    ''', (error, _now(), *job, worker_id))
+
+def has_work(conn, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Vrai s'il reste des tâches en attente ou en cours (qui peuvent en créer d'autres).
+    Les programmes des dates non encore passées restent en attente sans retenir les
+    workers : ils seront traités par un worker lancé après leur date.
+    """
+    row = conn.execute('''
+        SELECT 1 FROM jobs
+        WHERE status = 'running'
+           OR (status = 'pending' AND attempts < ? AND (kind != 'programme' OR date < ?))
+        LIMIT 1
+    ''', (max_attempts, date_cls.today().isoformat())).fetchone()
+    return row is not None
+
+def status(conn):
+    cursor = conn.execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status ORDER BY kind, status")
+    return cursor.fetchall()
+
+def run_worker(queue_file=QUEUE_FILE, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+               db_file=None, json_output=True, lease=DEFAULT_LEASE,
+               max_attempts=DEFAULT_MAX_ATTEMPTS, worker_id=None):
+    """
+    Boucle d'un worker : réserve des tâches dans la file, lance les extracteurs dans
+    un pool de `workers` threads et marque les tâches terminées. S'arrête quand la
+    file ne contient plus de tâche en attente ni en cours.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    conn = open_queue(queue_file)
+    limiter = HostLimiter(per_host)
+    # La base peut être partagée entre machines comme la file : pas de WAL
+    sink = DbSink(db_file, mode="shared").start() if db_file else None
+    pending = {}
+    done_count = 0
+
+    print(f"Worker {worker_id} démarré.")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # Une tâche n'est réservée que si un thread est libre : une tâche en
+                # attente dans le pool verrait son bail expirer sans être renouvelé
+                free = workers - len(pending)
+                if free > 0:
+                    for job in claim(conn, worker_id, free, lease, max_attempts):
+                        kind, date, reunion, course = job
+                        if kind == PROGRAMME:
+                            future = pool.submit(scrape_list, date, limiter)
+                        else:
+                            future = pool.submit(scrape_race, date, reunion, course, limiter)
+                        pending[future] = job
+
+                if not pending:
+                    if not has_work(conn, max_attempts):
+                        break
+                    # Des tâches sont réservées par d'autres workers : elles peuvent
+                    # créer de nouvelles courses ou expirer
+                    time.sleep(POLL_INTERVAL)
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    kind, date, reunion, course = job
+                    try:
+                        result = future.result()
+                        if kind == PROGRAMME:
+                            if not result:
+                                # get_course_info retourne aussi une liste vide en cas
+                                # d'erreur réseau : la date n'est tenue pour sans réunion
+                                # qu'après max_attempts essais (comme race_calendar.known_meetings)
+                                print(f"Aucune réunion pour la tâche {job}.")
+                                finish(conn, job, worker_id, "aucune réunion", max_attempts, exhausted="done")
+                                continue
+                            enqueue(conn, COURSE, races_from_list(result))
+                        else:
+                            write_race(date, reunion, course, result, sink=sink, json_output=json_output)
+                            if result["conditions"] is None:
+                                raise RuntimeError("page indisponible")
+                    except Exception as e:
+                        print(f"Erreur sur la tâche {job} : {e}")
+                        finish(conn, job, worker_id, str(e), max_attempts)
+                        continue
+                    finish(conn, job, worker_id)
+                    done_count += 1
+    finally:
+        if sink is not None:
+            sink.close()
+        conn.close()
+
+    print(f"Worker {worker_id} terminé : {done_count} tâches traitées.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="File de tâches partagée pour le backfill")
+    parser.add_argument("--queue", default=QUEUE_FILE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = subparsers.add_parser("seed", help="Ajoute une tâche par date")
+    seed_parser.add_argument("start_date", help="Date de début au format AAAA-MM-JJ")
+    seed_parser.add_argument("--end", default=None, help="Date de fin (aujourd'hui par défaut)")
+
+    worker_parser = subparsers.add_parser("worker", help="Traite les tâches de la file")
+    worker_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    worker_parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST)
+    worker_parser.add_argument("--lease", type=int, default=DEFAULT_LEASE,
+                               help="Durée du bail d'une tâche en secondes")
+    worker_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    worker_parser.add_argument("--db", default=None)
+    worker_parser.add_argument("--no-json", action="store_true")
+    worker_parser.add_argument("--cache-dir", default=CACHE_DIR)
+
+    subparsers.add_parser("status", help="Affiche l'avancement de la file")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        conn = open_queue(args.queue)
+        print(f"{seed(conn, args.start_date, args.end)} dates ajoutées à la file.")
+        conn.close()
+    elif args.command == "status":
+        conn = open_queue(args.queue)
+        for kind, job_status, count in status(conn):
+            print(f"{kind:<10} {job_status:<8} {count}")
+        conn.close()
+    else:
+        if args.no_json and not args.db:
+            parser.error("--no-json nécessite --db.")
+        configure_cache(args.cache_dir)
+        configure_http(pool_size=args.per_host)
+        run_worker(args.queue, workers=args.workers, per_host=args.per_host,
+                   db_file=args.db, json_output=not args.no_json, lease=args.lease,
+                   max_attempts=args.max_attempts)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows : on s'appuie uniquement sur O_APPEND
+    fcntl = None
+
+RACE_KEY = ("date", "reunion", "course")
+
+class _FileLock:
+    """
+    Verrou exclusif posé sur un fichier annexe <path>.lock.
+    Le verrou n'est pas posé sur le fichier de données lui-même car la compaction
+    le remplace : un écrivain bloqué sur l'ancien fichier y écrirait sans effet.
+    """
+    def __init__(self, path):
+        self.lock_path = f"{path}.lock"
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.fd = os.open(self.lock_path, os.O_WRONLY | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            os.close(self.fd)  # libère aussi le verrou
+            self.fd = None
+
+def append_record(path, record):
+    """
+    Ajoute un enregistrement en fin de fichier, sur une seule ligne.
+    Coût constant quelle que soit la taille du fichier ; l'écriture se fait en
+    un seul appel sous verrou, ce qui permet à plusieurs écrivains d'ajouter
+    des lignes en même temps sans les entrelacer.
+    """
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    with _FileLock(path):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            view = memoryview(line)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)
+
+def iter_records(path):
+    """
+    Parcourt les enregistrements d'un fichier JSONL.
+    Une dernière ligne tronquée (écriture interrompue) est ignorée.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Ligne invalide ignorée dans {path}.")
+
+def read_new_lines(path, offset=0):
+    """
+    Lit les enregistrements ajoutés depuis la position `offset` (en octets).
+    Seules les lignes complètes sont lues : une ligne en cours d'écriture sera
+    lue au prochain appel. Retourne (enregistrements, position du début de chaque
+    enregistrement, nouvelle position).
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+
+    end = data.rfind(b"\n") + 1
+    records, positions = [], []
+    position = offset
+    for line in data[:end].split(b"\n")[:-1]:
+        start, position = position, position + len(line) + 1
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+            positions.append(start)
+        except json.JSONDecodeError:
+            print(f"Ligne invalide ignorée dans {path}.")
+    return records, positions, offset + end
+
+def read_new_records(path, offset=0):
+    """Comme read_new_lines, sans les positions : retourne (enregistrements, nouvelle position)."""
+    records, _, offset = read_new_lines(path, offset)
+    return records, offset
+
+def load_records(path):
+    """
+    Charge une liste d'enregistrements depuis un fichier .jsonl ou depuis
+    l'ancien format .json (liste complète).
+    """
+    if path.endswith(".jsonl"):
+        return list(iter_records(path))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_record(path, record):
+    """
+    Sauvegarde un enregistrement : ajout d'une ligne pour un .jsonl,
+    ou réécriture complète de la liste pour l'ancien format .json.
+    """
+    if path.endswith(".jsonl"):
+        append_record(path, record)
+        return
+
+    try:
+        with open(path, "r", encoding="utf-8") as json_file:
+            records = json.load(json_file)
+            if not isinstance(records, list):
+                records = []
+    except (FileNotFoundError, json.JSONDecodeError):
+        print(f"Fichier {path} introuvable ou vide. Initialisation d'une nouvelle liste.")
+        records = []
+
+    records.append(record)
+    with open(path, "w", encoding="utf-8") as json_file:
+        json.dump(records, json_file, ensure_ascii=False, indent=4)
+
+def compact(path, key=RACE_KEY):
+    """
+    Supprime les doublons d'un fichier JSONL selon la clé (date, reunion, course).
+    C'est le dernier enregistrement d'une course qui est conservé.
+    Retourne (nombre de lignes lues, nombre de lignes conservées).
+    """
+    with _FileLock(path):
+        latest = {}
+        total = 0
+        for record in iter_records(path):
+            total += 1
+            record_key = tuple(record.get(k) for k in key)
+            latest.pop(record_key, None)
+            latest[record_key] = record
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in latest.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    return total, len(latest)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Dédoublonne des fichiers JSONL par (date, reunion, course)")
+    compact_parser.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    for path in args.files:
+        total, kept = compact(path)
+        print(f"{path} : {total} lignes lues, {kept} conservées.")
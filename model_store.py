@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import os
+from datetime import datetime
+
+import joblib
+
+MODELS_DIR = "models"
+# Version du format des artefacts : un artefact d'un autre format n'est pas chargé
+ARTIFACT_FORMAT = 1
+
+def save_artifact(artifact, models_dir=MODELS_DIR):
+    """
+    Enregistre `artifact` (dictionnaire : prétraitement, modèle, features, ...) dans
+    un nouveau fichier models_dir/ranker-AAAAMMJJ-HHMMSS.joblib. Les versions
+    précédentes sont conservées. Retourne le chemin du fichier.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(models_dir, f"ranker-{version}.joblib")
+    joblib.dump({**artifact, "format": ARTIFACT_FORMAT, "version": version}, path, compress=3)
+    return path
+
+def list_artifacts(models_dir=MODELS_DIR):
+    """Artefacts de `models_dir`, du plus ancien au plus récent."""
+    return sorted(glob.glob(os.path.join(models_dir, "ranker-*.joblib")))
+
+def load_artifact(path=None, models_dir=MODELS_DIR):
+    """Charge l'artefact `path`, ou le plus récent de `models_dir`."""
+    if path is None:
+        artifacts = list_artifacts(models_dir)
+        if not artifacts:
+            raise FileNotFoundError(f"Aucun modèle dans {models_dir}/ : lancer deep_learning.py")
+        path = artifacts[-1]
+
+    artifact = joblib.load(path)
+    if artifact.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} : format {artifact.get('format')} au lieu de {ARTIFACT_FORMAT}")
+    return artifact
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Liste des modèles enregistrés")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    args = parser.parse_args()
+
+    for path in list_artifacts(args.models_dir):
+        artifact = joblib.load(path)
+        metrics = artifact.get("metrics", {})
+        print(f"{path} : mode {artifact.get('mode')}, top-1 {metrics.get('top1', float('nan')):.3f}")
@@ -1,4 +1,4 @@
-import sqlite3
+from db_connection import get_connection
 
 def print_logo():
     logo = """
@@ -12,7 +12,7 @@ def print_logo():
     print("=== Nettoyage des courses orphelines en cours... ===\n")
 
 def clean_condition_courses(db_name):
-    conn = sqlite3.connect(db_name)
+    conn = get_connection(db_name)
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -29,11 +29,10 @@ def clean_condition_courses(db_name):
     conn.close()
     print("\n✅ Nettoyage terminé : suppression des courses inexistantes.")
 
-    import sqlite3
 
 def delete_invalid_tracking_rows(db_name="courses.db"):
     """Supprime les lignes de tracking dont (date, reunion, course) ne figurent pas dans la table courses."""
-    conn = sqlite3.connect(db_name)
+    conn = get_connection(db_name)
     cursor = conn.cursor()
 
     # Requête SQL pour supprimer les lignes de tracking non correspondantes
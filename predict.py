@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from db_connection import get_connection
+from dataset_schema import apply_schema
+from deep_learning import add_features
+from feature_store import read_dataset
+from model_store import MODELS_DIR, load_artifact
+from prepa_data import AGG_COLS, ENTITY_STARTS_COLS
+
+# Colonnes d'identification recopiées dans les résultats si présentes
+ID_COLS = ['race_id', 'numero', 'cheval']
+
+def features_from_file(path):
+    """Partants lus depuis un jeu Parquet (dossier ou fichier) ou un fichier CSV."""
+    if path.endswith(".csv"):
+        return pd.read_csv(path, parse_dates=['date'])
+    if os.path.isdir(path):
+        return read_dataset(path)
+    return pd.read_parquet(path)
+
+def features_from_db(db_file, race_ids):
+    """Partants des courses `race_ids`, lus dans la vue 'training_runners' de `db_file`."""
+    conn = get_connection(db_file, mode="readonly")
+    try:
+        placeholders = ", ".join("?" for _ in race_ids)
+        return pd.read_sql_query(
+            f"SELECT * FROM training_runners WHERE race_id IN ({placeholders})",
+            conn, params=list(race_ids), parse_dates=['date']
+        )
+    finally:
+        conn.close()
+
+def prepare_runners(df, medians=None):
+    """
+    Mêmes transformations que prepa_data.py et deep_learning.py, sans filtrer les
+    lignes : une course à venir n'a pas encore de classement. Les nombres de courses
+    manquants valent 0 (cheval, jockey, entraîneur, ... inconnu) et les autres agrégats
+    par cheval sont comblés avec les médianes enregistrées lors de la préparation.
+    """
+    df = apply_schema(df.copy())
+    df['day_of_week'] = df['date'].dt.dayofweek
+    df['month'] = df['date'].dt.month
+    df['year'] = df['date'].dt.year
+    df = df.fillna({col: 0 for col in ['horse_races'] + ENTITY_STARTS_COLS if col in df.columns})
+    if medians:
+        df = df.fillna({col: medians[col] for col in AGG_COLS})
+    return add_features(df)
+
+def score_runners(model, df):
+    """
+    Note les partants de `df` avec le modèle chargé par load_artifact. Retourne une
+    ligne par partant (race_id, numero, cheval, score, rank), rank 1 étant le
+    favori de sa course, triée par course puis par rang.
+    """
+    df = prepare_runners(df, model['medians'])
+    X = df[model['numeric_features'] + model['categorical_features']]
+    if model['preprocessor'] is not None:
+        X = model['preprocessor'].transform(X)
+
+    scores = df[[col for col in ID_COLS if col in df.columns]].copy()
+    scores['score'] = model['ranker'].predict(X)
+    scores['rank'] = scores.groupby('race_id')['score'].rank(ascending=False, method='first').astype(int)
+    return scores.sort_values(['race_id', 'rank']).reset_index(drop=True)
+
+def race_rankings(scores):
+    """Ordre d'arrivée prédit de chaque course : race_id -> liste des numéros."""
+    return scores.groupby('race_id', sort=True)['numero'].agg(list)
+
+def main(model_path=None, models_dir=MODELS_DIR, features=None, db_file="courses.db", race_ids=None, output=None):
+    start = time.perf_counter()
+    model = load_artifact(model_path, models_dir)
+    loaded = time.perf_counter()
+    print(f"Modèle {model['version']} ({model['mode']}) chargé en {loaded - start:.2f} s.")
+
+    df = features_from_file(features) if features else features_from_db(db_file, race_ids)
+    if df.empty:
+        print("Aucun partant à noter.")
+        return None
+    scores = score_runners(model, df)
+    print(f"{len(scores)} partants de {scores['race_id'].nunique()} courses notés "
+          f"en {time.perf_counter() - loaded:.2f} s.")
+
+    for race_id, numeros in race_rankings(scores).items():
+        print(f"Course {race_id} : {' - '.join(str(numero) for numero in numeros)}")
+    if output:
+        scores.to_csv(output, index=False)
+        print(f"Notes enregistrées dans {output}")
+    return scores
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Notation de courses avec le modèle enregistré")
+    parser.add_argument("--model", help="Fichier du modèle (par défaut : le plus récent)")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--features", help="Fichier de features (Parquet ou CSV)")
+    source.add_argument("--race-ids", type=int, nargs="+", help="Courses à lire dans la base")
+    parser.add_argument("--db", default="courses.db")
+    parser.add_argument("--output", help="Fichier CSV des notes par partant")
+    args = parser.parse_args()
+
+    try:
+        main(args.model, args.models_dir, args.features, args.db, args.race_ids, args.output)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Erreur : {e}")
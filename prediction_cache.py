@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+
+from db_connection import get_connection
+
+PREDICTIONS_FILE = "predictions.db"
+
+def open_cache(cache_file=PREDICTIONS_FILE):
+    """
+    Ouvre (et crée si besoin) le cache des classements du jour.
+
+    - race_predictions : dernier classement de chaque course, avec l'empreinte des
+      entrées dont il a été calculé ; une course n'est renotée que si l'empreinte change
+    """
+    conn = get_connection(cache_file)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS race_predictions (
+            date TEXT NOT NULL,
+            reunion TEXT NOT NULL,
+            course TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            model TEXT NOT NULL,
+            ranking TEXT NOT NULL,
+            scored_at TEXT,
+            PRIMARY KEY (date, reunion, course)
+        ) WITHOUT ROWID;
+    ''')
+    return conn
+
+def race_fingerprint(runners, model_version):
+    """
+    Empreinte des entrées d'une course : partants déclarés (non-partants exclus),
+    conditions (terrain, météo, ...) et version du modèle. Les lignes sont triées par
+    numéro : l'ordre de la page n'a pas d'influence.
+    """
+    payload = runners.sort_values("numero").to_json(orient="records", date_format="iso")
+    return hashlib.sha256(f"{model_version}\n{payload}".encode("utf-8")).hexdigest()
+
+def cached_fingerprints(conn, date):
+    """Empreintes des courses déjà notées d'une date : {(reunion, course): empreinte}."""
+    cursor = conn.execute(
+        "SELECT reunion, course, fingerprint FROM race_predictions WHERE date = ?", (date,)
+    )
+    return {(reunion, course): fingerprint for reunion, course, fingerprint in cursor}
+
+def save_prediction(conn, prediction):
+    """Enregistre le classement d'une course (voir race_day.race_prediction)."""
+    with conn:
+        conn.execute('''
+            INSERT INTO race_predictions (date, reunion, course, fingerprint, model, ranking, scored_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(date, reunion, course) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                model = excluded.model,
+                ranking = excluded.ranking,
+                scored_at = excluded.scored_at
+        ''', (
+            prediction["date"], prediction["reunion"], prediction["course"], prediction["fingerprint"],
+            prediction["model"], json.dumps(prediction["ranking"], ensure_ascii=False), prediction["scored_at"],
+        ))
+
+def load_predictions(conn, date):
+    """Derniers classements d'une date, au format de race_day.race_prediction."""
+    cursor = conn.execute('''
+        SELECT reunion, course, fingerprint, model, ranking, scored_at
+        FROM race_predictions WHERE date = ? ORDER BY reunion, course
+    ''', (date,))
+    return [
+        {"date": date, "reunion": reunion, "course": course, "fingerprint": fingerprint,
+         "model": model, "scored_at": scored_at, "ranking": json.loads(ranking)}
+        for reunion, course, fingerprint, model, ranking, scored_at in cursor
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Derniers classements enregistrés d'une date")
+    parser.add_argument("date", help="Date des courses au format AAAA-MM-JJ")
+    parser.add_argument("--cache", default=PREDICTIONS_FILE)
+    args = parser.parse_args()
+
+    conn = open_cache(args.cache)
+    for prediction in load_predictions(conn, args.date):
+        order = " - ".join(str(runner["numero"]) for runner in prediction["ranking"])
+        print(f"{prediction['reunion']} {prediction['course']} ({prediction['scored_at']}) : {order}")
+    conn.close()
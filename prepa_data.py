@@ -1,158 +1,271 @@
 #!/usr/bin/env python3
-import sqlite3
+import argparse
 import pandas as pd
 import numpy as np
+from db_connection import get_connection
+from feature_store import FEATURE_STORE_DIR, write_dataset, write_imputation
+from dataset_schema import apply_schema
+from horse_features import refresh_horse_features
+from entity_stats import refresh_entity_stats
+from to_db import ENTITY_STAT_COLUMNS
 
 def load_merged_data(db_name):
     """
-    Charge les données en joignant les 3 tables (races, results, tracking).
-    On sélectionne uniquement les colonnes utiles pour un modèle de prédiction.
-    """
-    conn = sqlite3.connect(db_name)
-    query = """
-    SELECT
-        r.id AS race_id,
-        r.date,
-        r.hippodrome,
-        r.style,
-        r.discipline AS race_discipline,
-        r.nombre_de_partants,
-        r.allocation,
-        r.terrain,
-        r.temperature,
-        r.ciel,
-        r.vent_vitesse,
-        r.vent_direction,
-
-        res.classement,
-        res.numero,
-        res.cheval,
-        res.corde,
-        res.poids,
-
-        t.vitessemax_kmh,
-        t.temps_officiel,
-        t.derniers600m,
-        t.derniers200m,
-        t.derniers100m,
-        t.distance_reelle,
-        t.distance_vainqueur
-
-    FROM races r
-    INNER JOIN results res
-        ON r.id = res.race_id
-    LEFT JOIN tracking t
-        ON r.id = t.race_id
-        AND CAST(res.numero AS TEXT) = CAST(t.numero AS TEXT);
-    """
-    df = pd.read_sql_query(query, conn)
-    df.to_csv("test2.csv", index=False)
+    Charge les données en joignant les 3 tables (races, results, tracking)
+    via la vue 'training_runners', qui ne sélectionne que les colonnes utiles
+    pour un modèle de prédiction.
+    """
+    conn = get_connection(db_name, mode="readonly")
+    # Vue créée par to_db.py : jointure sur (race_id, numero) résolue par index
+    query = "SELECT * FROM training_runners"
+    df = pd.read_sql_query(query, conn, parse_dates=['date'])
     conn.close()
-    return df
+    # Catégories et largeurs déclarées dans dataset_schema.py, dès la lecture
+    return apply_schema(df)
 
-def clean_and_enrich_data(df):
+NUMERIC_COLS = [
+    'nombre_de_partants', 'allocation', 'temperature',
+    'vent_vitesse', 'poids', 'classement',
+    'vitessemax_kmh', 'temps_officiel',
+    'derniers600m', 'derniers200m', 'derniers100m',
+    'distance_reelle', 'distance_vainqueur'
+]
+
+CRITICAL_COLS = [
+    'hippodrome', 'style', 'race_discipline',
+    'nombre_de_partants', 'allocation', 'terrain',
+    'temperature', 'ciel', 'vent_vitesse', 'vent_direction',
+    'cheval', 'classement'
+]
+
+AGG_COLS = [
+    'horse_avg_classement', 'horse_std_classement',
+    'horse_podium_rate', 'horse_avg_vmax'
+]
+HORSE_COLS = ['horse_races'] + AGG_COLS
+
+# Statistiques par jockey, entraîneur, ... (entity_stats.py) : parts et taux
+ENTITY_STARTS_COLS = [col for col in ENTITY_STAT_COLUMNS if col.endswith('_starts')]
+
+# Nombre de mois lus à la fois par le mode par morceaux
+DEFAULT_CHUNK_MONTHS = 1
+
+def clean_rows(df):
     """
+    Étapes ligne à ligne du nettoyage (sans agrégat) :
     1) Conversion de la date + création de features temporelles
     2) Conversion numérique des colonnes sélectionnées
-    3) Suppression des lignes sans colonnes critiques
-    4) Calcul d'agrégats historiques pour le cheval
-    5) Imputation (remplacement de NaN) dans les colonnes agrégées
+    3) Suppression des lignes sans date ou sans colonnes critiques
     """
 
     # ===================
-    # A) Convertir la colonne date + extraire jour, mois, année
+    # A) Convertir la colonne date
     # ===================
     df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    df = df.dropna(subset=['date'])  # Supprime les lignes sans date
-
-    df['day_of_week'] = df['date'].dt.dayofweek
-    df['month']       = df['date'].dt.month
-    df['year']        = df['date'].dt.year
 
     # ===================
     # B) Conversion en float/int pour les colonnes numériques
     # ===================
-    numeric_cols = [
-        'nombre_de_partants', 'allocation', 'temperature',
-        'vent_vitesse', 'poids', 'classement',
-        'vitessemax_kmh', 'temps_officiel',
-        'derniers600m', 'derniers200m', 'derniers100m',
-        'distance_reelle', 'distance_vainqueur'
-    ]
-
-    for col in numeric_cols:
-        df[col] = (
-            df[col]
-            .astype(str)          # convertit en string
-            .str.replace(' ', '') # retire espaces
-        )
-        df[col] = pd.to_numeric(df[col], errors='coerce')
 
-    # ===================
-    # C) Supprimer lignes sans colonnes "critiques"
-    # ===================
-    critical_cols = [
-        'hippodrome', 'style', 'race_discipline',
-        'nombre_de_partants', 'allocation', 'terrain',
-        'temperature', 'ciel', 'vent_vitesse', 'vent_direction',
-        'cheval', 'classement'
-    ]
-    df = df.dropna(subset=critical_cols)
+    # Les colonnes sont typées en base (voir to_db.py) : pas d'aller-retour en texte.
+    # to_numeric ne sert qu'aux colonnes entièrement nulles (LEFT JOIN sur tracking
+    # et horse_features), lues en 'object'
+    numeric = NUMERIC_COLS + HORSE_COLS + ENTITY_STAT_COLUMNS
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors='coerce')
 
     # ===================
-    # D) Calcul d'agrégats historiques pour le cheval
+    # C) Supprimer lignes sans date ou sans colonnes "critiques" (un seul filtrage)
     # ===================
-    df['horse_avg_classement'] = df.groupby('cheval')['classement'].transform('mean')
-    df['horse_std_classement'] = df.groupby('cheval')['classement'].transform('std')
-    df['horse_races'] = df.groupby('cheval')['classement'].transform('count')
-    df['horse_podium_rate'] = df.groupby('cheval')['classement'].transform(lambda x: (x <= 3).mean())
-    df['horse_avg_vmax'] = df.groupby('cheval')['vitessemax_kmh'].transform('mean')
+    df = df.dropna(subset=['date'] + CRITICAL_COLS)
 
-    # ===================
-    # E) Imputation : remplacer les NaN dans les agrégats
-    # ===================
+    # Features temporelles : jour, mois, année
+    df['day_of_week'] = df['date'].dt.dayofweek
+    df['month']       = df['date'].dt.month
+    df['year']        = df['date'].dt.year
+    return df
 
-    # 1) Pour 'horse_races', on met 0 si NaN
-    df['horse_races'] = df['horse_races'].fillna(0)
+def aggregate_medians(df):
+    """Médianes des agrégats par cheval de `df` (NaN ignorés)."""
+    return {col: df[col].median() for col in AGG_COLS}
+
+def impute_aggregates(df, medians=None):
+    """
+    Remplace les NaN dans les agrégats : 0 pour 'horse_races' et les parts par entité,
+    la médiane pour les autres agrégats par cheval. `medians` permet de fournir des
+    médianes calculées sur tout l'historique (mode par morceaux) ; sinon elles sont
+    calculées sur `df`. Les taux par entité restent NaN sans course antérieure.
+    """
+    # 1) Pour 'horse_races' et les parts par entité, on met 0 si NaN
+    for col in ['horse_races'] + ENTITY_STARTS_COLS:
+        df[col] = df[col].fillna(0).astype('int64')
 
     # 2) Les autres, on choisit la médiane
-    agg_cols = [
-        'horse_avg_classement', 'horse_std_classement',
-        'horse_podium_rate', 'horse_avg_vmax'
-    ]
-    for col in agg_cols:
-        median_val = df[col].median()
-        df[col] = df[col].fillna(median_val)
+    if medians is None:
+        medians = aggregate_medians(df)
+    for col in AGG_COLS:
+        df[col] = df[col].fillna(medians[col])
+    return df
+
+def clean_and_enrich_data(df):
+    """
+    1) Conversion de la date + création de features temporelles
+    2) Conversion numérique des colonnes sélectionnées
+    3) Suppression des lignes sans colonnes critiques
+    4) Imputation (remplacement de NaN) dans les agrégats par cheval
+
+    Les agrégats par cheval (horse_races, horse_avg_classement, ...) sont lus dans la
+    table horse_features (voir horse_features.py), les statistiques par jockey,
+    entraîneur, ... dans runner_entity_stats (voir entity_stats.py) : elles ne portent
+    que sur les courses antérieures à la date de chaque course.
+
+    Retourne le DataFrame nettoyé et les médianes d'imputation, à réutiliser pour
+    préparer les partants d'une course à venir (voir predict.py).
+    """
+    df = clean_rows(df)
+
+    # ===================
+    # D) Imputation : remplacer les NaN dans les agrégats (chevaux sans course antérieure)
+    # ===================
+    medians = aggregate_medians(df)
+    df = impute_aggregates(df, medians)
 
     # ===================
     # (Optionnel) Imputation pour autres colonnes
     # ===================
     # Exemple : On laisse tel quel ici, 
     # sinon on pourrait remplir la médiane / 0 :
-    # for col in numeric_cols:
+    # for col in NUMERIC_COLS:
     #     med = df[col].median()
     #     df[col] = df[col].fillna(med)
 
-    df = df.reset_index(drop=True)
-    return df
+    # Après nettoyage, les colonnes entières n'ont plus de NaN : largeurs déclarées
+    df = apply_schema(df).reset_index(drop=True)
+    return df, medians
+
+# =====================================================================
+# Mode par morceaux : mémoire bornée par la taille d'un morceau
+# =====================================================================
+
+def iter_merged_chunks(db_name, chunk_months=DEFAULT_CHUNK_MONTHS):
+    """
+    Variante de load_merged_data qui lit la jointure par blocs de `chunk_months` mois,
+    dans l'ordre des dates. Chaque bloc est une plage de dates de 'races', résolue
+    par l'index sur races(date) : aucun tri de toute la jointure n'est nécessaire.
+    """
+    conn = get_connection(db_name, mode="readonly")
+    try:
+        months = [row[0] for row in conn.execute(
+            "SELECT DISTINCT substr(date, 1, 7) FROM races WHERE date IS NOT NULL ORDER BY 1"
+        )]
+        # Bornes contiguës : [mois_0, mois_k), [mois_k, mois_2k), ..., [dernier, +inf)
+        for i in range(0, len(months), chunk_months):
+            start = months[i]
+            end = months[i + chunk_months] if i + chunk_months < len(months) else None
+            if end is None:
+                query = "SELECT * FROM training_runners WHERE date >= ?"
+                params = (start,)
+            else:
+                query = "SELECT * FROM training_runners WHERE date >= ? AND date < ?"
+                params = (start, end)
+            yield apply_schema(pd.read_sql_query(query, conn, params=params, parse_dates=['date']))
+    finally:
+        conn.close()
+
+def kept_rows_condition():
+    """
+    Condition SQL équivalente au filtrage de clean_rows sur 'training_runners' :
+    date et colonnes critiques renseignées, colonnes critiques numériques lues comme
+    des nombres (un texte resté en base serait converti en NaN par pd.to_numeric).
+    """
+    conditions = ["date IS NOT NULL"]
+    for col in CRITICAL_COLS:
+        if col in NUMERIC_COLS:
+            conditions.append(f"typeof({col}) IN ('integer', 'real')")
+        else:
+            conditions.append(f"{col} IS NOT NULL")
+    return " AND ".join(conditions)
+
+def history_medians(db_name):
+    """
+    Médianes des agrégats par cheval sur tout l'historique, calculées par SQLite
+    (ORDER BY ... LIMIT 1 OFFSET) sur les lignes conservées par clean_rows : le
+    résultat est celui de aggregate_medians sans charger les valeurs en mémoire.
+    """
+    conn = get_connection(db_name, mode="readonly")
+    try:
+        medians = {}
+        for col in AGG_COLS:
+            where = f"{kept_rows_condition()} AND typeof({col}) IN ('integer', 'real')"
+            count = conn.execute(f"SELECT COUNT(*) FROM training_runners WHERE {where}").fetchone()[0]
+            if count == 0:
+                medians[col] = np.nan
+                continue
+            # Nombre pair de valeurs : moyenne des deux valeurs centrales (comme pandas)
+            query = f"SELECT {col} FROM training_runners WHERE {where} ORDER BY {col} LIMIT 1 OFFSET ?"
+            low = conn.execute(query, ((count - 1) // 2,)).fetchone()[0]
+            high = conn.execute(query, (count // 2,)).fetchone()[0]
+            medians[col] = (low + high) / 2
+        return medians
+    finally:
+        conn.close()
+
+def clean_and_enrich_chunked(db_name, output=FEATURE_STORE_DIR, chunk_months=DEFAULT_CHUNK_MONTHS):
+    """
+    Mode par morceaux de clean_and_enrich_data, même résultat écrit au fil de l'eau
+    dans le jeu Parquet. La mémoire est bornée par un morceau.
+
+    1) Médianes d'imputation sur tout l'historique, calculées en SQL (history_medians)
+    2) Nettoyage, imputation et écriture de chaque morceau
+       (des mois entiers : chaque partition est écrite une seule fois)
+    """
+    medians = history_medians(db_name)
+
+    rows = 0
+    for chunk in iter_merged_chunks(db_name, chunk_months):
+        df = clean_rows(chunk)
+        if df.empty:
+            continue
+        df = apply_schema(impute_aggregates(df, medians)).reset_index(drop=True)
+        rows += write_dataset(df, output, overwrite=(rows == 0))
+    if rows == 0:
+        print("Aucune donnée à préparer.")
+    else:
+        write_imputation(medians, output)
+    return rows
+
+def main(db_name="courses.db", output=FEATURE_STORE_DIR, chunked=False, chunk_months=DEFAULT_CHUNK_MONTHS):
+    print("=== 0) Mise à jour des agrégats par cheval, jockey, entraîneur ===")
+    refresh_horse_features(db_name)
+    refresh_entity_stats(db_name)
+
+    if chunked:
+        print(f"=== Préparation par morceaux de {chunk_months} mois ===")
+        rows = clean_and_enrich_chunked(db_name, output, chunk_months)
+        print(f"{rows} lignes écrites dans {output}/")
+        return
 
-def main():
-    db_name = "courses.db"
     print("=== 1) Chargement et jointure (races + results + tracking) ===")
     df_raw = load_merged_data(db_name)
     print(f"Forme initiale : {df_raw.shape} (lignes, colonnes)")
 
     print("=== 2) Nettoyage, enrichissement, imputation ===")
-    df_clean = clean_and_enrich_data(df_raw)
+    df_clean, medians = clean_and_enrich_data(df_raw)
     print(f"Forme après nettoyage : {df_clean.shape}")
 
-    # Sauvegarde du DataFrame final
-    output_csv = "final_deeplearning_dataset_with_tracking.csv"
-    df_clean.to_csv(output_csv, index=False)
-    print(f"Fichier généré : {output_csv}")
+    # Sauvegarde du DataFrame final (Parquet partitionné par année et mois)
+    rows = write_dataset(df_clean, output, overwrite=True)
+    write_imputation(medians, output)
+    print(f"{rows} lignes écrites dans {output}/")
 
     # Aperçu
     print(df_clean.head(100))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Préparation du jeu de données d'entraînement")
+    parser.add_argument("--db", default="courses.db")
+    parser.add_argument("--output", default=FEATURE_STORE_DIR)
+    parser.add_argument("--chunked", action="store_true",
+                        help="Traite la jointure mois par mois (mémoire bornée)")
+    parser.add_argument("--chunk-months", type=int, default=DEFAULT_CHUNK_MONTHS)
+    args = parser.parse_args()
+    main(args.db, args.output, args.chunked, args.chunk_months)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import argparse
+from datetime import date as date_cls, datetime
+from db_connection import get_connection
+
+CALENDAR_FILE = "calendar.db"
+DEFAULT_MAX_ATTEMPTS = 3
+
+DATA_TYPES = ("conditions", "tracking", "table_arrive")
+
+def open_calendar(calendar_file=CALENDAR_FILE):
+    """
+    Ouvre (et crée si besoin) le calendrier persistant des réunions et des courses.
+
+    - calendar_days : dates dont la liste des réunions a été récupérée (provisoire
+      si fetched_at n'est pas postérieur à la date, voir known_meetings)
+    - meetings : réunions d'une date avec leur nombre de courses
+    - race_status : état du scraping de chaque course, par type de données
+      ('ok', 'vide' si la section est absente, 'erreur' si la page n'a pas pu être lue)
+    """
+    conn = get_connection(calendar_file)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS calendar_days (
+            date TEXT PRIMARY KEY,
+            nombre_reunions INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            fetched_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meetings (
+            date TEXT NOT NULL,
+            reunion TEXT NOT NULL,
+            nombre_courses INTEGER NOT NULL,
+            PRIMARY KEY (date, reunion)
+        );
+        CREATE TABLE IF NOT EXISTS race_status (
+            date TEXT NOT NULL,
+            reunion TEXT NOT NULL,
+            course TEXT NOT NULL,
+            conditions TEXT,
+            tracking TEXT,
+            table_arrive TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT,
+            PRIMARY KEY (date, reunion, course)
+        );
+    ''')
+    return conn
+
+def known_meetings(conn, date, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Retourne les réunions connues d'une date au format de get_course_info,
+    ou None si la liste doit être (re)téléchargée.
+
+    La liste du jour et des jours futurs est toujours retéléchargée. Une liste
+    récupérée le jour même (ou avant) est provisoire : get_course_info ne garde que
+    les réunions terminées, elle est donc retéléchargée une fois la date passée.
+    Une date sans réunion n'est considérée comme connue qu'après `max_attempts`
+    essais, car get_course_info retourne aussi une liste vide en cas d'erreur réseau.
+    """
+    if date >= date_cls.today().isoformat():
+        return None
+
+    row = conn.execute(
+        "SELECT nombre_reunions, attempts, fetched_at FROM calendar_days WHERE date = ?", (date,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    nombre_reunions, attempts, fetched_at = row
+    if not fetched_at or fetched_at[:10] <= date:
+        return None
+    if nombre_reunions == 0 and attempts < max_attempts:
+        return None
+
+    cursor = conn.execute(
+        "SELECT reunion, nombre_courses FROM meetings WHERE date = ? ORDER BY reunion", (date,)
+    )
+    return [
+        {"date": date, "reunion": reunion, "nombre_courses": str(nombre_courses)}
+        for reunion, nombre_courses in cursor
+    ]
+
+def save_meetings(conn, date, courses_data):
+    """Enregistre la liste des réunions d'une date retournée par get_course_info."""
+    with conn:
+        conn.execute('''
+            INSERT INTO calendar_days (date, nombre_reunions, attempts, fetched_at)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                nombre_reunions = excluded.nombre_reunions,
+                attempts = calendar_days.attempts + 1,
+                fetched_at = excluded.fetched_at
+        ''', (date, len(courses_data), datetime.now().isoformat(timespec="seconds")))
+        conn.executemany('''
+            INSERT INTO meetings (date, reunion, nombre_courses) VALUES (?, ?, ?)
+            ON CONFLICT(date, reunion) DO UPDATE SET nombre_courses = excluded.nombre_courses
+        ''', [
+            (date, course_info.get("reunion"), int(course_info.get("nombre_courses", 0)))
+            for course_info in courses_data
+        ])
+
+def race_statuses(records):
+    """
+    Calcule l'état de chaque type de données à partir du retour de scrape_race_page.
+    """
+    conditions = records.get("conditions")
+    tracking = records.get("tracking")
+    table_arrive = records.get("table_arrive")
+
+    return {
+        "conditions": "ok" if conditions else "erreur",
+        "tracking": "erreur" if tracking is None else ("ok" if tracking.get("details") else "vide"),
+        "table_arrive": "erreur" if table_arrive is None else ("ok" if table_arrive.get("result") else "vide"),
+    }
+
+def record_race(conn, date, reunion, course, records):
+    """Enregistre l'état du scraping d'une course et incrémente son nombre d'essais."""
+    statuses = race_statuses(records)
+    with conn:
+        conn.execute('''
+            INSERT INTO race_status (date, reunion, course, conditions, tracking, table_arrive, attempts, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(date, reunion, course) DO UPDATE SET
+                conditions = excluded.conditions,
+                tracking = excluded.tracking,
+                table_arrive = excluded.table_arrive,
+                attempts = race_status.attempts + 1,
+                updated_at = excluded.updated_at
+        ''', (date, reunion, course, statuses["conditions"], statuses["tracking"],
+              statuses["table_arrive"], datetime.now().isoformat(timespec="seconds")))
+    return statuses
+
+def pending_races(conn, races, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Filtre les triplets (date, reunion, course) à scraper : courses jamais vues,
+    ou incomplètes / en erreur ayant encore des essais disponibles.
+    """
+    if not races:
+        return []
+
+    status = {}
+    for date in {race[0] for race in races}:
+        cursor = conn.execute(
+            "SELECT reunion, course, conditions, tracking, table_arrive, attempts FROM race_status WHERE date = ?",
+            (date,)
+        )
+        for reunion, course, *states, attempts in cursor:
+            status[(date, reunion, course)] = (states, attempts)
+
+    pending = []
+    for race in races:
+        if race not in status:
+            pending.append(race)
+            continue
+        states, attempts = status[race]
+        if all(state == "ok" for state in states):
+            continue
+        if attempts < max_attempts:
+            pending.append(race)
+    return pending
+
+def summary(conn):
+    """Résumé de l'avancement du calendrier."""
+    days = conn.execute("SELECT COUNT(*) FROM calendar_days").fetchone()[0]
+    races = conn.execute("SELECT COUNT(*) FROM race_status").fetchone()[0]
+    complete = conn.execute(
+        "SELECT COUNT(*) FROM race_status WHERE conditions = 'ok' AND tracking = 'ok' AND table_arrive = 'ok'"
+    ).fetchone()[0]
+    failed = conn.execute(
+        "SELECT COUNT(*) FROM race_status WHERE conditions = 'erreur' OR tracking = 'erreur' OR table_arrive = 'erreur'"
+    ).fetchone()[0]
+    return {"dates": days, "courses": races, "completes": complete, "en_erreur": failed}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calendar", default=CALENDAR_FILE)
+    args = parser.parse_args()
+
+    conn = open_calendar(args.calendar)
+    for key, value in summary(conn).items():
+        print(f"{key} : {value}")
+    conn.close()
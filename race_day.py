@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date as date_cls, datetime
+
+import pandas as pd
+
+from scrapper_list_course import get_course_info
+from scrapper_launcher import HostLimiter, races_from_list, scrape_race, DEFAULT_WORKERS, DEFAULT_PER_HOST
+from scrapper_page import configure_http
+from condition_course_to_db import clean_amount
+from table_arrive_to_db import clean_classement, clean_number, clean_poids
+from db_connection import get_connection
+from horse_features import current_features, refresh_horse_features
+from entity_stats import current_stats, refresh_entity_stats
+from model_store import MODELS_DIR, load_artifact
+from predict import score_runners
+from prediction_cache import PREDICTIONS_FILE, open_cache, race_fingerprint, cached_fingerprints, save_prediction
+from jsonl_store import save_record
+
+PREDICTIONS_OUTPUT = "race_day_predictions.jsonl"
+NON_PARTANT = "NP"
+
+def is_finished(table_arrive):
+    """Une course est courue dès qu'un partant a un classement numérique."""
+    return any(
+        clean_classement(result.get("classement")) is not None
+        for result in table_arrive.get("result", [])
+    )
+
+def card_runners(conditions, table_arrive):
+    """
+    Partants déclarés d'une course à venir (non-partants exclus), une ligne par
+    partant avec les conditions de la course, aux noms de colonnes de la vue
+    'training_runners'.
+    """
+    meteo = conditions.get("meteo") or {}
+    race = {
+        "date": conditions.get("date"),
+        "hippodrome": conditions.get("hippodrome"),
+        "style": conditions.get("style"),
+        "race_discipline": conditions.get("discipline"),
+        "nombre_de_partants": clean_number(conditions.get("nombre_de_partants")),
+        "allocation": clean_amount(conditions.get("allocation")),
+        "terrain": conditions.get("terrain"),
+        "temperature": clean_number(meteo.get("temperature")),
+        "ciel": meteo.get("ciel"),
+        "vent_vitesse": clean_number(meteo.get("vent_vitesse")),
+        "vent_direction": meteo.get("vent_direction"),
+    }
+    runners = []
+    for result in table_arrive.get("result", []):
+        numero = clean_number(result.get("numero"))
+        if result.get("classement") == NON_PARTANT or numero is None:
+            continue
+        runners.append({
+            **race,
+            "numero": numero,
+            "cheval": result.get("cheval") or None,
+            "jockey": result.get("jockey") or None,
+            "entraineur": result.get("entraineur") or None,
+            "corde": clean_number(result.get("corde")),
+            "poids": clean_poids(result.get("poids")),
+        })
+    return pd.DataFrame(runners)
+
+def runner_features(conn, runners):
+    """
+    Ajoute aux partants leurs features d'historique, lues par clé dans la base :
+    agrégats par cheval (horse_state) et statistiques par entité (entity_state),
+    toutes deux features du modèle.
+    """
+    runners = runners.join(current_features(conn, runners["cheval"]), on="cheval")
+    return pd.concat([runners, current_stats(conn, runners)], axis=1)
+
+def upcoming_runners(records):
+    """
+    Partants d'une course à venir à partir de sa page scrapée, ou None si la course
+    est déjà courue ou si ses conditions ou ses partants manquent.
+    """
+    conditions, table_arrive = records.get("conditions"), records.get("table_arrive")
+    if not conditions or not table_arrive or is_finished(table_arrive):
+        return None
+    runners = card_runners(conditions, table_arrive)
+    return None if runners.empty else runners
+
+def score_race(model, conn, runners):
+    """Notes des partants d'une course, features d'historique comprises."""
+    # Une seule course : identifiant local pour le regroupement par course
+    runners = runners.assign(race_id=0)
+    return score_runners(model, runner_features(conn, runners))
+
+def race_prediction(date, reunion, course, scores, model, fingerprint=None):
+    """Enregistrement JSON d'une course notée."""
+    return {
+        "date": date,
+        "reunion": reunion,
+        "course": course,
+        "model": model["version"],
+        "fingerprint": fingerprint,
+        "scored_at": datetime.now().isoformat(timespec="seconds"),
+        "ranking": [
+            {"numero": int(row.numero), "cheval": row.cheval, "score": float(row.score), "rank": int(row.rank)}
+            for row in scores.itertuples()
+        ],
+    }
+
+def print_prediction(prediction):
+    order = " - ".join(str(runner["numero"]) for runner in prediction["ranking"])
+    print(f"🏇 {prediction['date']} | Réunion {prediction['reunion']} | {prediction['course']} : {order}")
+
+def jsonl_consumer(output=PREDICTIONS_OUTPUT):
+    """Consommateur qui ajoute chaque nouveau classement au fichier JSONL `output`."""
+    return lambda prediction: save_record(output, prediction)
+
+def timed_scrape(race, limiter):
+    start = time.perf_counter()
+    return scrape_race(*race, limiter), start
+
+def score_card(model, conn, races, limiter, workers=DEFAULT_WORKERS, cache=None, consumers=()):
+    """
+    Un passage sur les courses `races` : pages récupérées en parallèle, puis chaque
+    course à venir est notée dès réception de sa page et son classement transmis à
+    chaque fonction de `consumers`.
+
+    Avec `cache` (prediction_cache.open_cache), une course dont l'empreinte des
+    entrées (partants, non-partants, terrain, météo, modèle) n'a pas changé depuis le
+    dernier classement n'est ni renotée ni retransmise.
+    Retourne (classements produits, courses déjà courues, courses inchangées).
+    """
+    fingerprints = cached_fingerprints(cache, races[0][0]) if cache is not None and races else {}
+    predictions, finished, unchanged = [], set(), 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(timed_scrape, race, limiter): race for race in races}
+        for future in as_completed(futures):
+            race = futures[future]
+            try:
+                records, start = future.result()
+            except Exception as e:
+                print(f"Erreur lors du scraping de {race} : {e}")
+                continue
+
+            runners = upcoming_runners(records)
+            if runners is None:
+                if records.get("table_arrive") and is_finished(records["table_arrive"]):
+                    finished.add(race)
+                continue
+
+            fingerprint = race_fingerprint(runners, model["version"])
+            if fingerprints.get(race[1:]) == fingerprint:
+                unchanged += 1
+                continue
+
+            prediction = race_prediction(*race, score_race(model, conn, runners), model, fingerprint)
+            if cache is not None:
+                save_prediction(cache, prediction)
+            for consumer in consumers:
+                consumer(prediction)
+            predictions.append(prediction)
+            print(f"   notée en {time.perf_counter() - start:.2f} s (page comprise)")
+
+    return predictions, finished, unchanged
+
+def run_race_day(date=None, db_file="courses.db", model_path=None, models_dir=MODELS_DIR,
+                 workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, output=PREDICTIONS_OUTPUT,
+                 cache_file=PREDICTIONS_FILE, poll_interval=0):
+    """
+    Note toutes les courses à venir d'une journée (aujourd'hui par défaut) :
+    1) réunions du jour via get_course_info, y compris celles pas encore courues ;
+    2) pages des courses récupérées en parallèle (`workers` threads, `per_host` par hôte) ;
+    3) pour chaque course dès réception de sa page : partants déclarés, features
+       d'historique lues par clé dans `db_file`, notation par le modèle enregistré.
+    Le modèle est chargé une seule fois ; aucun réentraînement ni préparation complète.
+    Les états par cheval et par entité sont d'abord mis à jour de façon incrémentale :
+    les courses écrites depuis (DbSink, bulk_load) n'y figurent pas encore.
+
+    Avec `poll_interval` (secondes), les pages sont relues à intervalle régulier
+    jusqu'à ce que toutes les courses soient courues : seules les courses dont les
+    entrées ont changé sont renotées (cache `cache_file`), et les courses courues ne
+    sont plus relues. Chaque nouveau classement est affiché et ajouté à `output`.
+    Retourne tous les classements produits.
+    """
+    date = date or date_cls.today().isoformat()
+    model = load_artifact(model_path, models_dir)
+    refresh_horse_features(db_file)
+    refresh_entity_stats(db_file)
+    races = races_from_list(get_course_info(date, include_upcoming=True))
+    print(f"{len(races)} courses au programme du {date}, modèle {model['version']}.")
+
+    consumers = [print_prediction] + ([jsonl_consumer(output)] if output else [])
+    limiter = HostLimiter(per_host)
+    conn = get_connection(db_file, mode="readonly")
+    cache = open_cache(cache_file) if cache_file else None
+    predictions = []
+    try:
+        while races:
+            new, finished, unchanged = score_card(model, conn, races, limiter, workers, cache, consumers)
+            predictions.extend(new)
+            races = [race for race in races if race not in finished]
+            print(f"{len(new)} courses notées, {unchanged} inchangées, "
+                  f"{len(races)} encore à courir.")
+            if not poll_interval:
+                break
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Arrêt du suivi des courses.")
+    finally:
+        conn.close()
+        if cache is not None:
+            cache.close()
+
+    return predictions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Notation des courses à venir du jour")
+    parser.add_argument("--date", help="Date des courses au format AAAA-MM-JJ (par défaut : aujourd'hui)")
+    parser.add_argument("--db", default="courses.db", help="Base contenant horse_state et entity_state")
+    parser.add_argument("--model", help="Fichier du modèle (par défaut : le plus récent)")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Nombre de courses récupérées en parallèle")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                        help="Nombre maximal de requêtes simultanées par hôte")
+    parser.add_argument("--output", default=PREDICTIONS_OUTPUT, help="Fichier JSONL des classements")
+    parser.add_argument("--poll", type=float, default=0,
+                        help="Relit les pages toutes les N secondes jusqu'à la fin des courses (0 : un seul passage)")
+    parser.add_argument("--cache", default=PREDICTIONS_FILE,
+                        help="Cache des classements : seules les courses modifiées sont renotées")
+    parser.add_argument("--no-cache", action="store_true", help="Renote toutes les courses à chaque passage")
+    args = parser.parse_args()
+
+    configure_http(pool_size=max(args.per_host, 1))
+    try:
+        run_race_day(args.date, args.db, args.model, args.models_dir,
+                     args.workers, args.per_host, args.output,
+                     cache_file=None if args.no_cache else args.cache, poll_interval=args.poll)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Erreur : {e}")
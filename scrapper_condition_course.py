@@ -1,19 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
-import json
 import re
 import sys
 
+from scrapper_page import fetch_race_page
+from jsonl_store import save_record
+
+COURSE_OUTPUT = "condition_course.jsonl"
+
 def scraper_course(date, reunion, course):
-    url = f"https://www.equidia.fr/courses/{date}/{reunion}/{course}"
-    response = requests.get(url)
-    
-    if response.status_code != 200:
-        print(f"Erreur lors du scraping de la page {url}")
+    soup = fetch_race_page(date, reunion, course)
+    if soup is None:
         return None
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+    return extract_course(soup, date, reunion, course)
+
+def extract_course(soup, date, reunion, course):
+    """
+    Extrait les conditions de la course d'une page déjà parsée.
+    """
     course_data = {
         "date": date,
         "reunion": reunion,
@@ -146,26 +148,15 @@ def scraper_course(date, reunion, course):
     
     return course_data
 
-def save_course_data(date, reunion, course):
+def write_course_data(date, reunion, course, course_data, output_file=COURSE_OUTPUT):
+    """
+    Ajoute les conditions d'une course déjà extraites à condition_course.jsonl.
+    Un fichier .json conserve l'ancien mode (réécriture de toute la liste).
+    """
     try:
-        # Charger le fichier condition_course.json
-        try:
-            with open("condition_course.json", "r", encoding="utf-8") as json_file:
-                course_list = json.load(json_file)
-                if not isinstance(course_list, list):
-                    course_list = []
-        except (FileNotFoundError, json.JSONDecodeError):
-            print("Fichier condition_course.json introuvable ou vide. Initialisation d'une nouvelle liste.")
-            course_list = []
-
-        # Extraire les données de la course
-        course_data = scraper_course(date, reunion, course)
-        
         if course_data and any(course_data.values()):
             # Ajout des données si elles sont valides
-            course_list.append(course_data)
-            with open("condition_course.json", "w", encoding="utf-8") as json_file:
-                json.dump(course_list, json_file, ensure_ascii=False, indent=4)
+            save_record(output_file, course_data)
             print(f"✅ Données ajoutées pour la course {date} | Réunion {reunion} | {course}.")
         else:
             print(f"❌ Données invalides pour la course {date} | Réunion {reunion} | {course}.")
@@ -173,6 +164,11 @@ def save_course_data(date, reunion, course):
     except Exception as e:
         print(f"Erreur lors de la sauvegarde des données : {e}")
 
+def save_course_data(date, reunion, course):
+    # Extraire les données de la course
+    course_data = scraper_course(date, reunion, course)
+    write_course_data(date, reunion, course, course_data)
+
 def main():
     if len(sys.argv) != 4:
         print("Usage: scrapper_condition_course.py <date> <reunion> <course>")
@@ -1,8 +1,48 @@
+import argparse
 import json
 import os
-import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
-import subprocess
+from urllib.parse import urlparse
+
+from scrapper_list_course import LIST_URL, get_course_info
+from scrapper_page import (
+    race_url, configure_cache, configure_http, CACHE_DIR, TODAY_TTL,
+    CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES,
+)
+from scrapper_race import scrape_race_page
+from scrapper_condition_course import write_course_data
+from scrapper_tracking_course import write_tracking_data
+from scrapper_table_arrive import write_table_arrive_data
+from db_sink import DbSink
+from race_calendar import (
+    CALENDAR_FILE, DEFAULT_MAX_ATTEMPTS, open_calendar, known_meetings,
+    save_meetings, record_race, pending_races,
+)
+
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 4
+
+class HostLimiter:
+    """
+    Limite le nombre de requêtes simultanées vers un même hôte.
+    Un sémaphore est créé à la demande pour chaque hôte rencontré.
+    """
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = semaphore
+        return semaphore
 
 def load_list_course(file_path):
     """
@@ -15,18 +55,82 @@ def load_list_course(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def scrape_list(date, limiter):
+    """
+    Récupère la liste des réunions d'une date en respectant la limite par hôte.
+    """
+    with limiter.slot(LIST_URL.format(date=date)):
+        return get_course_info(date)
+
+def scrape_race(date, reunion, course, limiter):
+    """
+    Récupère la page d'une course une seule fois et lance les trois extracteurs
+    dans le processus courant.
+    """
+    with limiter.slot(race_url(date, reunion, course)):
+        return scrape_race_page(date, reunion, course)
+
+def write_race(date, reunion, course, records, sink=None, json_output=True):
+    """
+    Écrit les données d'une course : envoi au DbSink si fourni, et sortie JSONL
+    optionnelle. Appelée uniquement depuis le thread principal.
+    """
+    if sink is not None:
+        sink.put(records)
+    if json_output:
+        write_course_data(date, reunion, course, records["conditions"])
+        write_tracking_data(date, reunion, course, records["tracking"])
+        write_table_arrive_data(date, reunion, course, records["table_arrive"])
+
 def save_course_data(date, reunion, course):
     """
-    Fonction pour appeler scrapper_condition_course.py et sauvegarder les conditions des courses.
+    Récupère et sauvegarde les conditions, le tracking et l'arrivée d'une course.
     """
     print(f"Récupération des données pour la date {date}, Réunion {reunion}, Course {course}...")
-    subprocess.run(["python", "scrapper_condition_course.py", date, reunion, course])
-    subprocess.run(["python", "scrapper_tracking_course.py", date, reunion, course])
-    subprocess.run(["python", "scrapper_table_arrive.py", date, reunion, course])
+    records = scrape_race(date, reunion, course, HostLimiter(1))
+    write_race(date, reunion, course, records)
 
-def launch_scrappers(start_date):
+def races_from_list(courses_data):
+    """
+    Transforme la liste des réunions en triplets (date, reunion, course).
+    """
+    races = []
+    for course_info in courses_data:
+        date = course_info.get("date")
+        reunion = course_info.get("reunion")
+        nombre_courses = int(course_info.get("nombre_courses", 0))
+
+        for i in range(1, nombre_courses + 1):
+            races.append((date, reunion, f"C{i}"))
+    return races
+
+def iter_dates(start_date, end_date):
+    current_date = start_date
+    while current_date <= end_date:
+        yield current_date.strftime("%Y-%m-%d")
+        current_date += timedelta(days=1)
+
+def launch_scrappers(start_date, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                     db_file=None, json_output=True, calendar_file=CALENDAR_FILE,
+                     max_attempts=DEFAULT_MAX_ATTEMPTS):
     """
     Lance les scrapers pour toutes les dates depuis start_date jusqu'à aujourd'hui.
+
+    Les pages sont récupérées par un pool de `workers` threads, avec au plus
+    `per_host` requêtes simultanées par hôte. Les courses d'une date sont traitées
+    en priorité avant de passer à la date suivante, et les écritures sont faites
+    par le thread principal.
+
+    Si `db_file` est fourni, les enregistrements sont écrits directement dans la base
+    par un DbSink ; les fichiers JSONL deviennent une sortie optionnelle (`json_output`).
+
+    Le calendrier persistant (`calendar_file`, None pour le désactiver) permet de
+    reprendre un backfill : les réunions déjà connues ne sont pas retéléchargées et
+    seules les courses jamais vues, incomplètes ou en erreur sont relancées, dans la
+    limite de `max_attempts` essais.
+
+    Le cache HTML se configure avec scrapper_page.configure_cache ; en mode rejeu,
+    les extracteurs sont relancés sur les pages en cache sans aucun accès réseau.
     """
     # Convertir start_date en objet datetime
     try:
@@ -34,42 +138,126 @@ def launch_scrappers(start_date):
     except ValueError:
         print("Format de date invalide. Utilisez YYYY-MM-DD.")
         return
-    
-    today_date = datetime.now()
-    
-    # Itérer sur toutes les dates jusqu'à aujourd'hui
-    current_date = start_date
-    while current_date <= today_date:
-        date_str = current_date.strftime("%Y-%m-%d")
-        print(f"Lancement des scrapers pour la date {date_str}...")
-        
-        # Lancer scrapper_list_course.py pour mettre à jour list_course.json
-        print(date_str)
-        subprocess.run(["python", "scrapper_list_course.py", date_str])
-        
-        # Charger les données depuis list_course.json
-        file_path = "list_course.json"
-        courses_data = load_list_course(file_path)
-        
-        if not courses_data:
-            print(f"Aucune donnée trouvée pour la date {date_str}.")
-        else:
-            for course_info in courses_data:
-                date = course_info.get("date")
-                reunion = course_info.get("reunion")
-                nombre_courses = int(course_info.get("nombre_courses", 0))
-                
-                for i in range(1, nombre_courses + 1):
-                    course_id = f"C{i}"
-                    save_course_data(date, reunion, course_id)
-        
-        # Passer à la date suivante
-        current_date += timedelta(days=1)
-    
+
+    if db_file is None and not json_output:
+        print("Aucune sortie configurée : activez la base ou les fichiers JSONL.")
+        return
+
+    limiter = HostLimiter(per_host)
+    dates = iter_dates(start_date, datetime.now())
+    races = deque()
+    pending = {}
+    calendar = open_calendar(calendar_file) if calendar_file else None
+    sink = DbSink(db_file).start() if db_file else None
+    skipped = 0
+
+    def queue_races(courses_data):
+        nonlocal skipped
+        date_races = races_from_list(courses_data)
+        if calendar is not None:
+            to_scrape = pending_races(calendar, date_races, max_attempts)
+            skipped += len(date_races) - len(to_scrape)
+            date_races = to_scrape
+        races.extend(date_races)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # Garder le pool occupé sans soumettre tout l'historique d'un coup
+                while len(pending) < workers * 2:
+                    if races:
+                        race = races.popleft()
+                        pending[pool.submit(scrape_race, *race, limiter)] = ("course", race)
+                        continue
+                    date_str = next(dates, None)
+                    if date_str is None:
+                        break
+                    if calendar is not None:
+                        meetings = known_meetings(calendar, date_str, max_attempts)
+                        if meetings is not None:
+                            queue_races(meetings)
+                            continue
+                    print(f"Lancement des scrapers pour la date {date_str}...")
+                    pending[pool.submit(scrape_list, date_str, limiter)] = ("liste", date_str)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, key = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Erreur lors du scraping de {key} : {e}")
+                        continue
+
+                    if kind == "liste":
+                        if not result:
+                            print(f"Aucune donnée trouvée pour la date {key}.")
+                        if calendar is not None:
+                            save_meetings(calendar, key, result)
+                        queue_races(result)
+                    else:
+                        write_race(*key, result, sink=sink, json_output=json_output)
+                        if calendar is not None:
+                            record_race(calendar, *key, result)
+    finally:
+        if sink is not None:
+            sink.close()
+        if calendar is not None:
+            calendar.close()
+
+    if skipped:
+        print(f"{skipped} courses déjà complètes ont été ignorées.")
     print("Tous les scrappers ont été lancés avec succès pour toutes les dates.")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python script.py YYYY-MM-DD")
-    else:
-        launch_scrappers(sys.argv[1])
+    parser = argparse.ArgumentParser()
+    parser.add_argument("date", help="Date de début au format AAAA-MM-JJ")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Nombre de courses récupérées en parallèle")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                        help="Nombre maximal de requêtes simultanées par hôte")
+    parser.add_argument("--connect-timeout", type=float, default=CONNECT_TIMEOUT,
+                        help="Délai d'attente de connexion HTTP en secondes")
+    parser.add_argument("--read-timeout", type=float, default=READ_TIMEOUT,
+                        help="Délai d'attente de lecture HTTP en secondes")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES,
+                        help="Nouvelles tentatives sur erreur réseau ou statut 429/5xx")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="Dossier du cache HTML compressé")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Désactive le cache HTML")
+    parser.add_argument("--cache-ttl", type=int, default=TODAY_TTL,
+                        help="Durée de validité en secondes des pages récupérées au plus tard le jour de la course")
+    parser.add_argument("--replay", action="store_true",
+                        help="Rejoue les extracteurs depuis le cache, sans accès réseau")
+    parser.add_argument("--db", default=None,
+                        help="Écrit directement les courses dans cette base SQLite (ex. courses.db)")
+    parser.add_argument("--no-json", action="store_true",
+                        help="Désactive la sortie JSONL (nécessite --db)")
+    parser.add_argument("--calendar", default=CALENDAR_FILE,
+                        help="Calendrier persistant des réunions et de l'état des courses")
+    parser.add_argument("--no-calendar", action="store_true",
+                        help="Re-scrape toutes les courses sans consulter le calendrier")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Nombre d'essais maximum pour une course incomplète")
+    args = parser.parse_args()
+
+    if args.replay and args.no_cache:
+        parser.error("--replay nécessite le cache HTML.")
+    configure_cache(None if args.no_cache else args.cache_dir,
+                    offline=args.replay, ttl=args.cache_ttl)
+    # Une connexion keep-alive par requête simultanée autorisée vers l'hôte
+    configure_http(pool_size=max(args.per_host, 1), connect_timeout=args.connect_timeout,
+                   read_timeout=args.read_timeout, retries=args.retries)
+    if args.no_json and not args.db:
+        parser.error("--no-json nécessite --db.")
+
+    # En mode rejeu, toutes les courses sont ré-extraites quel que soit leur état
+    calendar_file = None if (args.replay or args.no_calendar) else args.calendar
+
+    launch_scrappers(args.date, workers=args.workers, per_host=args.per_host,
+                     db_file=args.db, json_output=not args.no_json,
+                     calendar_file=calendar_file, max_attempts=args.max_attempts)
@@ -1,21 +1,32 @@
-import requests
-from bs4 import BeautifulSoup
 import json
 import argparse
 
-def get_course_info(date):
-    url = f"https://www.equidia.fr/courses-hippique?date={date}"
+from scrapper_page import fetch_page, parse_page
+
+LIST_URL = "https://www.equidia.fr/courses-hippique?date={date}"
+
+def get_course_info(date, include_upcoming=False):
+    url = LIST_URL.format(date=date)
     headers = {"User-Agent": "Mozilla/5.0"}  # Éviter le blocage par certains sites
-    response = requests.get(url, headers=headers)
+    html = fetch_page(url, headers=headers, page_date=date)
     
-    if response.status_code != 200:
+    if html is None:
         print("Erreur lors de la récupération de la page.")
         return []
     
-    soup = BeautifulSoup(response.text, "html.parser")
-    
+    return extract_course_info(parse_page(html), date, include_upcoming)
+
+def extract_course_info(soup, date, include_upcoming=False):
+    """
+    Extrait les réunions de galop d'une page de programme déjà parsée.
+    Par défaut, seules les réunions terminées ('finish-row') sont retenues ;
+    `include_upcoming` ajoute celles du jour qui ne sont pas encore courues.
+    """
     courses = []
-    race_divs = soup.find_all("div", class_="row clickable table-row row-reunion fill-primary-blue-50 text-primary-blue-50 finish-row")
+    if include_upcoming:
+        race_divs = soup.find_all("div", class_="row-reunion")
+    else:
+        race_divs = soup.find_all("div", class_="row clickable table-row row-reunion fill-primary-blue-50 text-primary-blue-50 finish-row")
     
     for race in race_divs:
         if race.find("use", {"xlink:href": "#discipline-galop"}):
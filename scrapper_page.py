@@ -0,0 +1,319 @@
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import date as date_cls
+
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    HTML_PARSER = "lxml"
+except ImportError:
+    lxml = None
+    HTML_PARSER = "html.parser"
+
+# Les blocs <script> et <style> (dont les gros états JSON embarqués) ne sont lus par
+# aucun extracteur et n'apparaissent pas dans .text : on les retire avant le parsing.
+_UNUSED_BLOCKS = re.compile(r"<(script|style)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+
+RACE_URL = "https://www.equidia.fr/courses/{date}/{reunion}/{course}"
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# Sections de la page d'une course lues par les extracteurs : en-tête (hippodrome, prix),
+# style, bloc #conditions, table d'arrivée et table de tracking. L'union XPath retourne
+# les éléments dans l'ordre du document.
+RACE_SECTIONS = " | ".join([
+    f"//div[{_has_class('title-holder')}]",
+    f"(//p[{_has_class('text-primary-blue')}])[1]",
+    "//div[@id='conditions']",
+    f"//table[{_has_class('course-result-table')}]",
+    f"//tr[{_has_class('tracking-table--header')}]/ancestor::table[1]",
+])
+
+# Client HTTP partagé : connexions keep-alive, délais d'attente et nouvelles tentatives
+DEFAULT_POOL_SIZE = 10
+CONNECT_TIMEOUT = 5  # secondes
+READ_TIMEOUT = 30  # secondes
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0  # secondes
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Attente maximale demandée par Retry-After : elle se fait en occupant la place de l'hôte
+MAX_RETRY_AFTER = 60  # secondes
+
+_http = {
+    "session": None,
+    "pool_size": DEFAULT_POOL_SIZE,
+    "timeout": (CONNECT_TIMEOUT, READ_TIMEOUT),
+    "retries": MAX_RETRIES,
+    "backoff": BACKOFF_BASE,
+}
+_http_lock = threading.Lock()
+
+CACHE_DIR = "cache_html"
+TODAY_TTL = 15 * 60  # secondes
+
+# Configuration du cache : désactivé par défaut, activé par le launcher
+_cache = {"dir": None, "offline": False, "ttl": TODAY_TTL}
+
+def configure_cache(cache_dir=CACHE_DIR, offline=False, ttl=TODAY_TTL):
+    """
+    Active le cache HTML sur disque.
+
+    - cache_dir : dossier du cache (None pour le désactiver)
+    - offline : mode rejeu, les pages sont lues uniquement depuis le cache
+    - ttl : durée de validité (en secondes) des pages récupérées au plus tard le
+      jour de leur date (voir _is_fresh)
+    """
+    if offline and cache_dir is None:
+        raise ValueError("Le mode rejeu nécessite un dossier de cache.")
+    _cache["dir"] = cache_dir
+    _cache["offline"] = offline
+    _cache["ttl"] = ttl
+
+def is_offline():
+    return _cache["offline"]
+
+def configure_http(pool_size=DEFAULT_POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                   read_timeout=READ_TIMEOUT, retries=MAX_RETRIES, backoff=BACKOFF_BASE):
+    """
+    Règle le client HTTP partagé. `pool_size` doit couvrir le nombre de requêtes
+    simultanées vers un même hôte pour que les connexions soient réutilisées.
+    """
+    with _http_lock:
+        _http["pool_size"] = pool_size
+        _http["timeout"] = (connect_timeout, read_timeout)
+        _http["retries"] = retries
+        _http["backoff"] = backoff
+        if _http["session"] is not None:
+            _http["session"].close()
+            _http["session"] = None
+
+def get_session():
+    """Session requests partagée par tous les scrapers (pool de connexions keep-alive)."""
+    with _http_lock:
+        if _http["session"] is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=_http["pool_size"], pool_maxsize=_http["pool_size"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http["session"] = session
+        return _http["session"]
+
+def _retry_delay(attempt, response=None):
+    """
+    Attente avant une nouvelle tentative : Retry-After si fourni (borné à
+    MAX_RETRY_AFTER), sinon backoff exponentiel à gigue complète.
+    """
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(int(retry_after), MAX_RETRY_AFTER)
+    return random.uniform(0, _http["backoff"] * 2 ** attempt)
+
+def http_get(url, headers=None):
+    """
+    GET avec délais d'attente (connexion, lecture) et nouvelles tentatives sur les
+    erreurs réseau et les statuts 429/5xx. Retourne la réponse, ou None si la page
+    n'a pas pu être récupérée.
+    """
+    session = get_session()
+    for attempt in range(_http["retries"] + 1):
+        last_attempt = attempt == _http["retries"]
+        try:
+            response = session.get(url, headers=headers, timeout=_http["timeout"])
+        except requests.RequestException as e:
+            # Erreurs réseau, délais dépassés, réponses tronquées ou mal encodées
+            if last_attempt:
+                print(f"Échec de la requête {url} après {attempt + 1} essais : {e}")
+                return None
+            time.sleep(_retry_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and not last_attempt:
+            time.sleep(_retry_delay(attempt, response))
+            continue
+        return response
+
+def race_url(date, reunion, course):
+    return RACE_URL.format(date=date, reunion=reunion, course=course)
+
+def cache_path(url):
+    """
+    Chemin du fichier compressé associé à une URL.
+    """
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(_cache["dir"], key[:2], f"{key}.html.gz")
+
+def _is_fresh(path, page_date):
+    """
+    Une page récupérée après la fin de sa date n'expire jamais : la course est courue
+    et son tracking publié. Une page récupérée le jour même ou avant (programme
+    partiel, course sans tracking) expire après le TTL, même une fois la date passée ;
+    elle est alors revalidée (voir fetch_page).
+    """
+    mtime = os.path.getmtime(path)
+    if page_date is not None and date_cls.fromtimestamp(mtime).isoformat() > page_date:
+        return True
+    return time.time() - mtime < _cache["ttl"]
+
+def read_cache(url, page_date=None):
+    """
+    Retourne le HTML en cache pour une URL, ou None s'il est absent ou expiré.
+    En mode rejeu, les pages expirées sont tout de même retournées.
+    """
+    if _cache["dir"] is None:
+        return None
+
+    path = cache_path(url)
+    if not os.path.exists(path):
+        return None
+    if not _cache["offline"] and not _is_fresh(path, page_date):
+        return None
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return f.read()
+
+def read_stale_cache(url):
+    """
+    Retourne le HTML en cache et ses validateurs HTTP (ETag, Last-Modified), même
+    si l'entrée est expirée. Retourne (None, {}) si la page n'est pas en cache.
+    """
+    if _cache["dir"] is None:
+        return None, {}
+
+    path = cache_path(url)
+    if not os.path.exists(path):
+        return None, {}
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        html = f.read()
+    try:
+        with open(f"{path}.meta.json", "r", encoding="utf-8") as f:
+            validators = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        validators = {}
+    return html, validators
+
+def touch_cache(url):
+    """Prolonge la validité d'une entrée confirmée par une réponse 304."""
+    os.utime(cache_path(url))
+
+def write_cache(url, html, validators=None):
+    """
+    Écrit une page dans le cache, avec ses validateurs HTTP éventuels.
+    Le fichier est d'abord écrit sous un nom temporaire puis renommé,
+    pour ne jamais laisser d'entrée tronquée.
+    """
+    if _cache["dir"] is None:
+        return
+
+    path = cache_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+
+    if validators:
+        tmp_meta = f"{path}.meta.json.{suffix}"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(validators, f)
+        os.replace(tmp_meta, f"{path}.meta.json")
+
+    tmp_path = f"{path}.{suffix}"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp_path, path)
+
+def fetch_page(url, headers=None, page_date=None):
+    """
+    Télécharge une page et retourne son HTML, ou None si elle n'a pas pu être récupérée.
+    Si le cache est actif, la page est d'abord cherchée sur disque ; en mode rejeu,
+    aucune requête réseau n'est faite. Une entrée expirée est revalidée par une
+    requête conditionnelle (If-None-Match / If-Modified-Since) : une réponse 304
+    la prolonge sans retélécharger la page.
+    """
+    html = read_cache(url, page_date)
+    if html is not None:
+        return html
+
+    if _cache["offline"]:
+        print(f"Page absente du cache : {url}")
+        return None
+
+    stale_html, validators = read_stale_cache(url)
+    request_headers = dict(headers or {})
+    if stale_html is not None:
+        if validators.get("etag"):
+            request_headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            request_headers["If-Modified-Since"] = validators["last_modified"]
+
+    response = http_get(url, headers=request_headers)
+    if response is None:
+        return None
+
+    if response.status_code == 304 and stale_html is not None:
+        touch_cache(url)
+        return stale_html
+
+    if response.status_code != 200:
+        print(f"Erreur lors du scraping de la page {url}")
+        return None
+
+    write_cache(url, response.text, {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    })
+    return response.text
+
+def parse_page(html):
+    """
+    Parse une page avec lxml si disponible (sinon html.parser), après retrait
+    des blocs script/style qui ne servent à aucun extracteur.
+    """
+    return BeautifulSoup(_UNUSED_BLOCKS.sub("", html), HTML_PARSER)
+
+def parse_sections(html, sections=RACE_SECTIONS):
+    """
+    Parse uniquement les sections utiles d'une page.
+
+    Le document complet est parcouru par lxml (en C), puis seules les sections
+    sélectionnées par `sections` sont reconstruites en arbre BeautifulSoup pour les
+    extracteurs. Sans lxml, la page entière est parsée avec parse_page.
+    """
+    if lxml is None:
+        return parse_page(html)
+
+    try:
+        tree = lxml.html.fromstring(_UNUSED_BLOCKS.sub("", html))
+    except (ValueError, lxml.etree.ParserError):
+        return parse_page(html)
+
+    kept = []
+    for element in tree.xpath(sections):
+        # Une section contenue dans une autre déjà retenue n'est pas dupliquée
+        if any(ancestor in kept for ancestor in element.iterancestors()):
+            continue
+        kept.append(element)
+
+    fragment = "".join(
+        lxml.html.tostring(element, encoding="unicode", with_tail=False) for element in kept
+    )
+    return BeautifulSoup(f"<html><body>{fragment}</body></html>", HTML_PARSER)
+
+def fetch_race_page(date, reunion, course):
+    """
+    Télécharge et parse une seule fois la page d'une course.
+    Le document retourné est partagé par tous les extracteurs.
+    """
+    html = fetch_page(race_url(date, reunion, course), page_date=date)
+    if html is None:
+        return None
+    return parse_sections(html)
@@ -0,0 +1,20 @@
+from scrapper_page import fetch_race_page
+from scrapper_condition_course import extract_course
+from scrapper_tracking_course import extract_tracking_data
+from scrapper_table_arrive import extract_table_arrive_data
+
+def scrape_race_page(date, reunion, course):
+    """
+    Récupère la page d'une course une seule fois et lance les trois extracteurs dessus.
+    Retourne un dictionnaire avec les conditions, le tracking et la table d'arrivée
+    (chaque entrée vaut None si la page ou la section est indisponible).
+    """
+    soup = fetch_race_page(date, reunion, course)
+    if soup is None:
+        return {"conditions": None, "tracking": None, "table_arrive": None}
+
+    return {
+        "conditions": extract_course(soup, date, reunion, course),
+        "tracking": extract_tracking_data(soup, date, reunion, course),
+        "table_arrive": extract_table_arrive_data(soup, date, reunion, course),
+    }
@@ -1,18 +1,24 @@
 import sys
-import json
-from bs4 import BeautifulSoup
-import requests
+
+from scrapper_page import fetch_race_page
+from jsonl_store import save_record
+
+TABLE_ARRIVE_OUTPUT = "table_arrive.jsonl"
 
 def scrape_table_arrive_data(date, reunion, course):
     """
     Fonction pour extraire les données de la table d'arrivée.
     """
-    try:
-        url = f"https://www.equidia.fr/courses/{date}/{reunion}/{course}"
-        response = requests.get(url)
-        response.raise_for_status()
+    soup = fetch_race_page(date, reunion, course)
+    if soup is None:
+        return None
+    return extract_table_arrive_data(soup, date, reunion, course)
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+def extract_table_arrive_data(soup, date, reunion, course):
+    """
+    Extrait la table d'arrivée d'une page déjà parsée.
+    """
+    try:
         table = soup.find('table', class_='course-result-table')
         if not table:
             print("❌ Table des résultats introuvable.")
@@ -77,32 +83,29 @@ def scrape_table_arrive_data(date, reunion, course):
         print(f"Erreur lors du scraping : {e}")
         return None
 
-def save_table_arrive_data(date, reunion, course):
+def write_table_arrive_data(date, reunion, course, table_arrive_data, output_file=TABLE_ARRIVE_OUTPUT):
     """
-    Sauvegarde les données de la table d'arrivée dans un fichier JSON.
+    Ajoute une table d'arrivée déjà extraite à table_arrive.jsonl.
+    Un fichier .json conserve l'ancien mode (réécriture de toute la liste).
     """
     try:
-        try:
-            with open("table_arrive.json", "r", encoding="utf-8") as json_file:
-                table_arrive_list = json.load(json_file)
-                if not isinstance(table_arrive_list, list):
-                    table_arrive_list = []
-        except (FileNotFoundError, json.JSONDecodeError):
-            print("Fichier table_arrive.json introuvable ou vide. Initialisation d'une nouvelle liste.")
-            table_arrive_list = []
-
-        table_arrive_data = scrape_table_arrive_data(date, reunion, course)
-
         if table_arrive_data and any(table_arrive_data.values()):
-            table_arrive_list.append(table_arrive_data)
-            with open("table_arrive.json", "w", encoding="utf-8") as json_file:
-                json.dump(table_arrive_list, json_file, ensure_ascii=False, indent=4)
+            # Ajout des données si elles sont valides
+            save_record(output_file, table_arrive_data)
             print(f"✅ Données de la table d'arrivée ajoutées pour la course {date} | Réunion {reunion} | {course}.")
         else:
             print(f"❌ Données de la table d'arrivée invalides pour la course {date} | Réunion {reunion} | {course}.")
+
     except Exception as e:
         print(f"Erreur lors de la sauvegarde des données de la table d'arrivée : {e}")
 
+def save_table_arrive_data(date, reunion, course):
+    """
+    Sauvegarde les données de la table d'arrivée dans un fichier JSON.
+    """
+    table_arrive_data = scrape_table_arrive_data(date, reunion, course)
+    write_table_arrive_data(date, reunion, course, table_arrive_data)
+
 def main():
     if len(sys.argv) != 4:
         print("Usage: scrapper_table_arrive.py <date> <reunion> <course>")
@@ -1,19 +1,21 @@
-import json
 import re
 import sys
-import requests
-from bs4 import BeautifulSoup
 
-def scrape_tracking_data(date, reunion, course):
-    url = f"https://www.equidia.fr/courses/{date}/{reunion}/{course}"
-    response = requests.get(url)
+from scrapper_page import fetch_race_page
+from jsonl_store import save_record
 
-    if response.status_code != 200:
-        print(f"Erreur lors du scraping de la page {url}")
-        return None
+TRACKING_OUTPUT = "tracking_course.jsonl"
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+def scrape_tracking_data(date, reunion, course):
+    soup = fetch_race_page(date, reunion, course)
+    if soup is None:
+        return None
+    return extract_tracking_data(soup, date, reunion, course)
 
+def extract_tracking_data(soup, date, reunion, course):
+    """
+    Extrait les données de tracking d'une page déjà parsée.
+    """
     tracking_data = {
         "date": date,
         "reunion": reunion,
@@ -36,8 +38,12 @@ def scrape_tracking_data(date, reunion, course):
         if table_header:
             headers = [th.text.strip().lower().replace(" ", "_") for th in table_header.find_all("th")]
 
-        # Extraction des lignes de données
-        table_rows = soup.find_all("tr")[1:]  # Ignorer les headers
+        # Extraction des lignes de données, limitée à la table de tracking si elle existe
+        tracking_table = table_header.find_parent("table") if table_header else None
+        if tracking_table is not None:
+            table_rows = [row for row in tracking_table.find_all("tr") if row is not table_header]
+        else:
+            table_rows = soup.find_all("tr")[1:]  # Ignorer les headers
         for row in table_rows:
             horse_data = {}
 
@@ -66,26 +72,15 @@ def scrape_tracking_data(date, reunion, course):
 
     return tracking_data
 
-def save_tracking_data(date, reunion, course):
+def write_tracking_data(date, reunion, course, tracking_data, output_file=TRACKING_OUTPUT):
+    """
+    Ajoute les données de tracking d'une course déjà extraites à tracking_course.jsonl.
+    Un fichier .json conserve l'ancien mode (réécriture de toute la liste).
+    """
     try:
-        # Charger le fichier tracking_course.json
-        try:
-            with open("tracking_course.json", "r", encoding="utf-8") as json_file:
-                tracking_list = json.load(json_file)
-                if not isinstance(tracking_list, list):
-                    tracking_list = []
-        except (FileNotFoundError, json.JSONDecodeError):
-            print("Fichier tracking_course.json introuvable ou vide. Initialisation d'une nouvelle liste.")
-            tracking_list = []
-
-        # Extraire les donnees de la course
-        tracking_data = scrape_tracking_data(date, reunion, course)
-
         if tracking_data and any(tracking_data.values()):
-            # Ajout des donnees si elles sont valides
-            tracking_list.append(tracking_data)
-            with open("tracking_course.json", "w", encoding="utf-8") as json_file:
-                json.dump(tracking_list, json_file, ensure_ascii=False, indent=4)
+            # Ajout des données si elles sont valides
+            save_record(output_file, tracking_data)
             print(f"✅ Données de tracking ajoutées pour la course {date} | Reunion {reunion} | {course}.")
         else:
             print(f"❌ Données de tracking invalides pour la course {date} | Reunion {reunion} | {course}.")
@@ -93,6 +88,11 @@ def save_tracking_data(date, reunion, course):
     except Exception as e:
         print(f"Erreur lors de la sauvegarde des données de tracking : {e}")
 
+def save_tracking_data(date, reunion, course):
+    # Extraire les donnees de la course
+    tracking_data = scrape_tracking_data(date, reunion, course)
+    write_tracking_data(date, reunion, course, tracking_data)
+
 def main():
     if len(sys.argv) != 4:
         print("Usage: scrapper_tracking_course.py <date> <reunion> <course>")
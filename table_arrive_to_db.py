@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
-import sqlite3
-import json
 import re
 
-# Charger les données JSON
+from jsonl_store import load_records
+from condition_course_to_db import race_id_map
+from db_connection import get_connection
+
+# Charger les données JSONL (ou l'ancien fichier JSON)
 def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    return load_records(file_path)
 
 # Nettoyer et convertir classement en int
 def clean_classement(classement):
@@ -15,6 +16,13 @@ def clean_classement(classement):
     match = re.search(r'\d+', str(classement))
     return int(match.group()) if match else None
 
+# Convertir numero et corde en int (None si la valeur n'est pas un nombre)
+def clean_number(value):
+    try:
+        return int(str(value).strip())
+    except (ValueError, TypeError):
+        return None
+
 # Nettoyer et convertir poids en float
 def clean_poids(poids):
     if not poids:
@@ -25,14 +33,69 @@ def clean_poids(poids):
     except ValueError:
         return None
 
-def insert_data(conn, data):
+# Upsert sur la clé naturelle (race_id, numero) : recharger un fichier ne crée pas de doublon.
+# 'version' reçoit le numéro de changement suivant à chaque insertion et à chaque
+# modification effective (une ligne identique n'est pas réécrite) : c'est le filigrane
+# des mises à jour incrémentales (horse_features.py, entity_stats.py)
+RESULT_INSERT = """
+    INSERT INTO results (
+        race_id, classement, numero, cheval, jockey, entraineur, corde, poids, ecarts, version
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM results))
+    ON CONFLICT(race_id, numero) DO UPDATE SET
+        classement = excluded.classement,
+        cheval = excluded.cheval,
+        jockey = excluded.jockey,
+        entraineur = excluded.entraineur,
+        corde = excluded.corde,
+        poids = excluded.poids,
+        ecarts = excluded.ecarts,
+        version = excluded.version
+    WHERE (results.classement, results.cheval, results.jockey, results.entraineur,
+           results.corde, results.poids, results.ecarts)
+        IS NOT (excluded.classement, excluded.cheval, excluded.jockey, excluded.entraineur,
+                excluded.corde, excluded.poids, excluded.ecarts)
+"""
+
+def result_rows(course, race_id):
+    """
+    Transforme la table d'arrivée d'une course en lignes de la table 'results'.
+    Seuls les résultats dont les champs requis (numero, cheval, corde, poids, classement)
+    sont renseignés sont conservés.
+    """
+    rows = []
+    for result in course.get('result', []):
+        classement = clean_classement(result.get('classement'))
+        numero = clean_number(result.get('numero'))
+        cheval = result.get('cheval')
+        jockey = result.get('jockey')
+        entraineur = result.get('entraineur')
+        corde = clean_number(result.get('corde'))
+        poids = clean_poids(result.get('poids'))
+        ecarts = result.get('ecarts')
+
+        # Vérifier que les champs requis ne sont pas vides
+        if not ((numero is not None) and cheval and (corde is not None) and (poids is not None) and (classement is not None)):
+            print("Champ(s) requis manquant(s) dans le résultat, enregistrement ignoré.")
+            continue
+
+        rows.append((
+            race_id, classement, numero, cheval, jockey, entraineur, corde, poids, ecarts
+        ))
+    return rows
+
+def insert_data(conn, data, race_ids=None):
     """
     Pour chaque course dans le JSON, recherche la course correspondante dans la table 'races'
     à l'aide des champs date, reunion et course, et insère les résultats dans la table 'results'
     uniquement si les champs requis (numero, cheval, jockey, entraineur, corde, poids, classement) sont renseignés.
+
+    La correspondance vers race_id est lue une seule fois (ou fournie via `race_ids`)
+    et les lignes sont insérées par executemany.
     """
-    cursor = conn.cursor()
-    
+    if race_ids is None:
+        race_ids = race_id_map(conn)
+
+    rows = []
     for course in data:
         date = course.get('date')
         reunion = course.get('reunion')
@@ -42,52 +105,28 @@ def insert_data(conn, data):
             print("Informations manquantes pour identifier la course, enregistrement ignoré.")
             continue
 
-        # Recherche du race_id dans la table races
-        cursor.execute("""
-            SELECT id FROM races WHERE date = ? AND reunion = ? AND course = ?
-        """, (date, reunion, course_num))
-        race = cursor.fetchone()
+        # Recherche du race_id dans la correspondance en mémoire
+        race_id = race_ids.get((date, reunion, course_num))
         
-        if race is None:
+        if race_id is None:
             print(f"Course non trouvée pour : date={date}, reunion={reunion}, course={course_num}")
             continue
         
-        race_id = race[0]
-        
         # Parcourir les résultats de la course
-        for result in course.get('result', []):
-            classement = clean_classement(result.get('classement'))
-            numero = result.get('numero')
-            cheval = result.get('cheval')
-            jockey = result.get('jockey')
-            entraineur = result.get('entraineur')
-            corde = result.get('corde')
-            poids = clean_poids(result.get('poids'))
-            ecarts = result.get('ecarts')
-            
-            # Vérifier que les champs requis ne sont pas vides
-            if not (numero and cheval and corde and (poids is not None) and (classement is not None)):
-                print("Champ(s) requis manquant(s) dans le résultat, enregistrement ignoré.")
-                continue
+        rows.extend(result_rows(course, race_id))
 
-            cursor.execute("""
-                INSERT INTO results (
-                    race_id, classement, numero, cheval, jockey, entraineur, corde, poids, ecarts
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                race_id, classement, numero, cheval, jockey, entraineur, corde, poids, ecarts
-            ))
-    
+    conn.executemany(RESULT_INSERT, rows)
     conn.commit()
+    return len(rows)
 
 if __name__ == "__main__":
-    json_file = "table_arrive.json"  # Chemin vers votre fichier JSON contenant les résultats
+    json_file = "table_arrive.jsonl"  # Chemin vers votre fichier JSON contenant les résultats
     db_name = "courses.db"  # Nom de votre base de données SQLite
     
     data = load_json(json_file)
     
     # Connexion à la base de données (les tables 'races' et 'results' doivent déjà exister)
-    conn = sqlite3.connect(db_name)
+    conn = get_connection(db_name)
     
     insert_data(conn, data)
     conn.close()
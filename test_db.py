@@ -1,9 +1,9 @@
-import sqlite3
 import pandas as pd
 import numpy as np
+from db_connection import get_connection
 
 # Connexion à la base de données
-conn = sqlite3.connect("courses.db")
+conn = get_connection("courses.db", mode="readonly")
 cursor = conn.cursor()
 
 # Exécution de la requête SELECT
@@ -1,11 +1,338 @@
 #!/usr/bin/env python3
 import sqlite3
+from db_connection import get_connection
 
-def create_tables(db_file):
-    """Crée la base de données et les tables si elles n'existent pas."""
+# Colonnes des tables des partants. Les valeurs numériques sont converties une seule
+# fois au chargement (table_arrive_to_db, tracking_to_db) : temps en secondes (REAL),
+# numéro et corde en INTEGER
+TABLE_COLUMNS = {
+    "results": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        race_id INTEGER NOT NULL,
+        classement INTEGER,
+        numero INTEGER,
+        cheval TEXT,
+        jockey TEXT,
+        entraineur TEXT,
+        corde INTEGER,
+        poids REAL,
+        ecarts TEXT,
+        version INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(race_id) REFERENCES races(id) ON DELETE CASCADE
+    ''',
+    "tracking": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        race_id INTEGER NOT NULL,
+        discipline TEXT,
+        numero INTEGER,
+        nom TEXT,
+        classement INTEGER,
+        vitessemax_kmh REAL,
+        temps_officiel REAL,
+        derniers600m REAL,
+        derniers200m REAL,
+        derniers100m REAL,
+        distance_reelle REAL,
+        distance_vainqueur REAL,
+        version INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(race_id) REFERENCES races(id) ON DELETE CASCADE
+    ''',
+}
+
+# Colonnes autrefois déclarées TEXT, avec leur type actuel
+NUMERIC_COLUMNS = {
+    "results": {"numero": "INTEGER", "corde": "INTEGER"},
+    "tracking": {
+        "numero": "INTEGER",
+        "temps_officiel": "REAL",
+        "derniers600m": "REAL",
+        "derniers200m": "REAL",
+        "derniers100m": "REAL",
+    },
+}
+
+# Montants de 'races' autrefois stockés tels qu'affichés ("45 000")
+AMOUNT_COLUMNS = ("allocation", "enjeux_sg")
+
+def add_version_columns(cursor):
+    """
+    Ajoute la colonne 'version' (numéro de changement, voir RESULT_INSERT) aux tables
+    'results' et 'tracking' d'une base existante. Les lignes existantes reçoivent
+    leur id : les filigranes enregistrés (derniers id traités) restent valables.
+    """
+    for table in TABLE_COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        if "version" in {row[1] for row in cursor.fetchall()}:
+            continue
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute(f"UPDATE {table} SET version = id")
+
+def migrate_numeric_columns(conn):
+    """
+    Convertit sur place les colonnes numériques d'une base créée avec l'ancien schéma.
+    SQLite ne permet pas de changer le type d'une colonne : 'results' et 'tracking'
+    sont recréées puis recopiées (leurs index sont recréés ensuite par create_tables).
+    Une valeur texte qui n'est pas un nombre devient NULL ; les lignes dont la course
+    n'existe plus dans 'races' ne sont pas recopiées (clé étrangère).
+
+    Chaque table est migrée dans sa propre transaction explicite, annulée en cas
+    d'erreur : une migration interrompue laisse l'ancienne table intacte. `conn`
+    doit être ouverte avec isolation_level=None.
+    """
+    cursor = conn.cursor()
+    for table, numeric in NUMERIC_COLUMNS.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        declared = {row[1]: row[2].upper() for row in cursor.fetchall()}
+        if all(declared.get(column) == type_ for column, type_ in numeric.items()):
+            continue
+
+        columns = list(declared)
+        expressions = [
+            f"CASE WHEN TRIM({column}) GLOB '[0-9]*' THEN CAST(TRIM({column}) AS {numeric[column]}) END"
+            if column in numeric else column
+            for column in columns
+        ]
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}_typed;")
+            cursor.execute(f"CREATE TABLE {table}_typed ({TABLE_COLUMNS[table]});")
+            cursor.execute(f"""
+                INSERT INTO {table}_typed ({", ".join(columns)})
+                SELECT {", ".join(expressions)} FROM {table}
+                WHERE race_id IN (SELECT id FROM races);
+            """)
+            count = cursor.rowcount
+            cursor.execute(f"DROP TABLE {table};")
+            cursor.execute(f"ALTER TABLE {table}_typed RENAME TO {table};")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        print(f"Table {table} migrée vers les colonnes numériques ({count} lignes).")
+
+    cursor.execute("BEGIN")
+    try:
+        for column in AMOUNT_COLUMNS:
+            cursor.execute(f"""
+                UPDATE races
+                SET {column} = CAST(REPLACE(REPLACE(REPLACE({column}, ' ', ''), char(160), ''), char(8239), '') AS INTEGER)
+                WHERE typeof({column}) = 'text';
+            """)
+            if cursor.rowcount:
+                print(f"{cursor.rowcount} montants convertis dans races.{column}.")
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+def create_runner_keys(cursor):
+    """
+    Crée les index UNIQUE (race_id, numero) sur 'results' et 'tracking'.
+    Sur une base existante, les doublons sont d'abord supprimés en gardant
+    la ligne la plus récente de chaque partant.
+    """
+    for table in ("results", "tracking"):
+        index_name = f"idx_{table}_race_numero"
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,)
+        )
+        if cursor.fetchone():
+            continue
+
+        cursor.execute(f'''
+            DELETE FROM {table}
+            WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY race_id, numero);
+        ''')
+        if cursor.rowcount:
+            print(f"{cursor.rowcount} doublons supprimés de la table {table}.")
+        cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {table}(race_id, numero);")
+
+# Statistiques par entité (entity_stats.py) : parts, taux de victoire et de podium
+ENTITY_STATS = ("jockey", "entraineur", "jockey_entraineur", "cheval_hippodrome", "cheval_terrain")
+ENTITY_STAT_COLUMNS = [
+    f"{entity}_{stat}" for entity in ENTITY_STATS for stat in ("starts", "win_rate", "podium_rate")
+]
+
+def create_feature_tables(cursor):
+    """
+    Crée les tables des agrégats par cheval, calculés par horse_features.py :
+    - horse_features : agrégats de chaque partant sur ses courses antérieures à la date
+      de la course (aucune fuite de la course elle-même ni des suivantes)
+    - horse_state : sommes cumulées par cheval jusqu'à sa dernière course traitée,
+      point de départ des mises à jour incrémentales
+    - runner_entity_stats / entity_state : mêmes principes pour les statistiques par
+      jockey, entraîneur, couple jockey × entraîneur et cheval × hippodrome / terrain
+      (entity_state est indexée par (entity, key1, key2) pour une lecture en O(1))
+    - feature_watermarks : dernières versions de 'results' et 'tracking' prises en
+      compte (la colonne garde son nom d'origine, last_id)
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS horse_features (
+            race_id INTEGER NOT NULL,
+            numero INTEGER NOT NULL,
+            cheval TEXT NOT NULL,
+            date DATE NOT NULL,
+            horse_races INTEGER NOT NULL,
+            horse_avg_classement REAL,
+            horse_std_classement REAL,
+            horse_podium_rate REAL,
+            horse_avg_vmax REAL,
+            PRIMARY KEY (race_id, numero),
+            FOREIGN KEY(race_id) REFERENCES races(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS horse_state (
+            cheval TEXT PRIMARY KEY,
+            last_date DATE NOT NULL,
+            starts INTEGER NOT NULL,
+            classement_sum REAL NOT NULL,
+            classement_sum_sq REAL NOT NULL,
+            podiums INTEGER NOT NULL,
+            vmax_sum REAL NOT NULL,
+            vmax_count INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    ''')
+    entity_columns = ",\n            ".join(
+        f"{col} {'INTEGER' if col.endswith('_starts') else 'REAL'}" for col in ENTITY_STAT_COLUMNS
+    )
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS runner_entity_stats (
+            race_id INTEGER NOT NULL,
+            numero INTEGER NOT NULL,
+            {entity_columns},
+            PRIMARY KEY (race_id, numero),
+            FOREIGN KEY(race_id) REFERENCES races(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS entity_state (
+            entity TEXT NOT NULL,
+            key1 TEXT NOT NULL,
+            key2 TEXT NOT NULL DEFAULT '',
+            last_date DATE NOT NULL,
+            starts INTEGER NOT NULL,
+            wins INTEGER NOT NULL,
+            podiums INTEGER NOT NULL,
+            PRIMARY KEY (entity, key1, key2)
+        ) WITHOUT ROWID;
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feature_watermarks (
+            source TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            updated_at TEXT
+        );
+    ''')
+    # Anciennes statistiques : les jockeys, entraîneurs, ... vides ('') étaient regroupés
+    # sous une même clé. Leurs filigranes sont effacés : le prochain entity_stats.refresh
+    # recalcule tout (jockey et entraineur n'ont qu'une clé, key2 y est toujours '')
+    cursor.execute('''
+        SELECT 1 FROM entity_state
+        WHERE TRIM(key1) = '' OR (TRIM(key2) = '' AND entity NOT IN ('jockey', 'entraineur'))
+        LIMIT 1
+    ''')
+    if cursor.fetchone():
+        cursor.execute("DELETE FROM feature_watermarks WHERE source LIKE 'entity_stats:%'")
+    # Lignes modifiées depuis le dernier filigrane
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_version ON results(version);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracking_version ON tracking(version);")
+    # Historique d'un cheval, d'un jockey, d'un entraîneur : lu à chaque mise à jour incrémentale
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_cheval ON results(cheval);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_jockey ON results(jockey);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_results_entraineur ON results(entraineur);")
+
+# Colonnes lues par la requête d'entraînement, dans les index couvrants
+RESULTS_TRAINING_COLUMNS = ("classement", "cheval", "corde", "poids")
+TRACKING_TRAINING_COLUMNS = (
+    "vitessemax_kmh", "temps_officiel", "derniers600m", "derniers200m", "derniers100m",
+    "distance_reelle", "distance_vainqueur",
+)
+
+TRAINING_VIEW = f'''
+    CREATE VIEW training_runners AS
+    SELECT
+        r.id AS race_id,
+        r.date,
+        r.hippodrome,
+        r.style,
+        r.discipline AS race_discipline,
+        r.nombre_de_partants,
+        r.allocation,
+        r.terrain,
+        r.temperature,
+        r.ciel,
+        r.vent_vitesse,
+        r.vent_direction,
+
+        res.classement,
+        res.numero,
+        res.cheval,
+        res.corde,
+        res.poids,
+
+        t.vitessemax_kmh,
+        t.temps_officiel,
+        t.derniers600m,
+        t.derniers200m,
+        t.derniers100m,
+        t.distance_reelle,
+        t.distance_vainqueur,
+
+        hf.horse_races,
+        hf.horse_avg_classement,
+        hf.horse_std_classement,
+        hf.horse_podium_rate,
+        hf.horse_avg_vmax,
+
+        {", ".join(f"es.{col}" for col in ENTITY_STAT_COLUMNS)}
+
+    FROM races r
+    INNER JOIN results res
+        ON res.race_id = r.id
+    LEFT JOIN tracking t INDEXED BY idx_tracking_training
+        ON t.race_id = res.race_id
+        AND t.numero = res.numero
+    LEFT JOIN horse_features hf
+        ON hf.race_id = res.race_id
+        AND hf.numero = res.numero
+    LEFT JOIN runner_entity_stats es
+        ON es.race_id = res.race_id
+        AND es.numero = res.numero
+'''
+
+def create_training_view(cursor):
+    """
+    Crée la vue 'training_runners' (une ligne par partant) et ses index couvrants.
+    Les index (race_id, numero, colonnes lues) résolvent chaque jointure par une
+    recherche d'index, sans lire les tables 'results' et 'tracking' : le coût par
+    partant ne dépend pas de la taille de la table 'tracking'.
+    La vue force l'index couvrant de 'tracking' : sinon SQLite préfère l'index UNIQUE
+    (race_id, numero), qui oblige à relire chaque ligne de la table.
+    Les index sur race_id seul, préfixes de ces index, sont supprimés.
+    """
+    cursor.execute("DROP INDEX IF EXISTS idx_results_race_id;")
+    cursor.execute("DROP INDEX IF EXISTS idx_tracking_race_id;")
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_results_training
+        ON results(race_id, numero, {", ".join(RESULTS_TRAINING_COLUMNS)});
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_tracking_training
+        ON tracking(race_id, numero, {", ".join(TRACKING_TRAINING_COLUMNS)});
+    ''')
+    cursor.execute("DROP VIEW IF EXISTS training_runners;")
+    cursor.execute(TRAINING_VIEW)
+
+def create_tables(db_file, mode="write"):
+    """
+    Crée la base de données et les tables si elles n'existent pas.
+    `mode` est le profil de connexion utilisé (voir db_connection.PROFILES).
+    """
+    conn = None
     try:
         # Connexion à la base de données (le fichier sera créé s'il n'existe pas)
-        conn = sqlite3.connect(db_file)
+        conn = get_connection(db_file, mode=mode)
         cursor = conn.cursor()
 
         # Création de la table 'races'
@@ -31,53 +358,50 @@ def create_tables(db_file):
             );
         ''')
 
-        # Création de la table 'results'
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                race_id INTEGER NOT NULL,
-                classement INTEGER,
-                numero TEXT,
-                cheval TEXT,
-                jockey TEXT,
-                entraineur TEXT,
-                corde TEXT,
-                poids REAL,
-                ecarts TEXT,
-                FOREIGN KEY(race_id) REFERENCES races(id) ON DELETE CASCADE
-            );
-        ''')
+        # Création des tables 'results' et 'tracking'
+        for table, columns in TABLE_COLUMNS.items():
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns});")
 
-        # Création de la table 'tracking'
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tracking (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                race_id INTEGER NOT NULL,
-                discipline TEXT,
-                numero TEXT,
-                nom TEXT,
-                classement INTEGER,
-                vitessemax_kmh REAL,
-                temps_officiel TEXT,
-                derniers600m TEXT,
-                derniers200m TEXT,
-                derniers100m TEXT,
-                distance_reelle REAL,
-                distance_vainqueur REAL,
-                FOREIGN KEY(race_id) REFERENCES races(id) ON DELETE CASCADE
-            );
-        ''')
+        # Anciennes bases : numéro de changement, puis colonnes numériques stockées en
+        # texte. Cette migration a sa propre connexion, en mode autocommit pour gérer
+        # ses transactions
+        add_version_columns(cursor)
+        conn.commit()
+        migration = get_connection(db_file, isolation_level=None)
+        try:
+            migrate_numeric_columns(migration)
+        finally:
+            migration.close()
 
         # Création des index pour optimiser les jointures et les recherches
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_races_date_reunion_course ON races(date, reunion, course);
         ''')
+
+        # Clés naturelles des partants : un seul résultat et un seul tracking par (course, numéro)
+        create_runner_keys(cursor)
+
+        # Agrégats par cheval (horse_features.py)
+        create_feature_tables(cursor)
+
+        # Index et vue de la requête d'entraînement (prepa_data.py)
+        create_training_view(cursor)
+
+        # Table des filigranes de chargement incrémental (voir bulk_load.py)
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_results_race_id ON results(race_id);
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_tracking_race_id ON tracking(race_id);
+            CREATE TABLE IF NOT EXISTS ingest_state (
+                source TEXT PRIMARY KEY,
+                file_offset INTEGER NOT NULL,
+                file_inode INTEGER,
+                updated_at TEXT,
+                read_offset INTEGER
+            );
         ''')
+        # read_offset : fin de la dernière lecture, au-delà de file_offset si des
+        # enregistrements attendaient leur course (voir bulk_load.pending_mark)
+        cursor.execute("PRAGMA table_info(ingest_state)")
+        if "read_offset" not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE ingest_state ADD COLUMN read_offset INTEGER")
 
         # Valider les modifications et fermer la connexion
         conn.commit()
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
-import json
-import sqlite3
 from datetime import datetime
 
+from jsonl_store import load_records
+from condition_course_to_db import race_id_map
+from db_connection import get_connection
+
 def clean_int(value):
     """Convertit une valeur en int si possible, sinon retourne None."""
     try:
@@ -30,7 +32,8 @@ def time_to_seconds(time_str):
     Exemple : "1'30''50" donnera 90.50 secondes.
     """
     try:
-        parts = time_str.replace("'", ":").replace("''", ".").split(":")
+        # Les centièmes ('') doivent être remplacés avant les minutes (')
+        parts = time_str.replace("''", ".").replace("'", ":").split(":")
         minutes = int(parts[0])
         seconds = float(parts[1])
         return minutes * 60 + seconds
@@ -64,7 +67,7 @@ def process_json(data):
                 "reunion": reunion,
                 "course": course_id,
                 "discipline": discipline,
-                "numero": detail.get("numero"),
+                "numero": clean_int(detail.get("numero")),
                 "nom": detail.get("nom"),
                 "classement": clean_int(detail.get("classement")),
                 "vitessemax_kmh": clean_float(detail.get("vitessemax_(km/h)")),
@@ -88,65 +91,96 @@ def process_json(data):
             results.append(result)
     return results
 
-def save_to_db(results, db_name="courses.db"):
+# Upsert sur la clé naturelle (race_id, numero) : recharger un fichier ne crée pas de doublon.
+# 'version' : numéro de changement, comme dans table_arrive_to_db.RESULT_INSERT
+TRACKING_INSERT = """
+    INSERT INTO tracking (
+        race_id, discipline, numero, nom, classement, vitessemax_kmh, 
+        temps_officiel, derniers600m, derniers200m, derniers100m, 
+        distance_reelle, distance_vainqueur, version
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM tracking))
+    ON CONFLICT(race_id, numero) DO UPDATE SET
+        discipline = excluded.discipline,
+        nom = excluded.nom,
+        classement = excluded.classement,
+        vitessemax_kmh = excluded.vitessemax_kmh,
+        temps_officiel = excluded.temps_officiel,
+        derniers600m = excluded.derniers600m,
+        derniers200m = excluded.derniers200m,
+        derniers100m = excluded.derniers100m,
+        distance_reelle = excluded.distance_reelle,
+        distance_vainqueur = excluded.distance_vainqueur,
+        version = excluded.version
+    WHERE (tracking.discipline, tracking.nom, tracking.classement, tracking.vitessemax_kmh,
+           tracking.temps_officiel, tracking.derniers600m, tracking.derniers200m,
+           tracking.derniers100m, tracking.distance_reelle, tracking.distance_vainqueur)
+        IS NOT (excluded.discipline, excluded.nom, excluded.classement, excluded.vitessemax_kmh,
+                excluded.temps_officiel, excluded.derniers600m, excluded.derniers200m,
+                excluded.derniers100m, excluded.distance_reelle, excluded.distance_vainqueur)
+"""
+
+def tracking_row(entry, race_id):
+    """Transforme un enregistrement issu de process_json en ligne de la table 'tracking'."""
+    return (
+        race_id,
+        entry["discipline"],
+        entry["numero"],
+        entry["nom"],
+        entry["classement"],
+        entry["vitessemax_kmh"],
+        entry["temps_officiel"],
+        entry["derniers600m"],
+        entry["derniers200m"],
+        entry["derniers100m"],
+        entry["distance_reelle"],
+        entry["distance_vainqueur"]
+    )
+
+def insert_tracking(conn, results, race_ids=None):
     """
-    Enregistre les données de suivi dans la table 'tracking' de la base SQLite existante.
-    Pour chaque enregistrement, le script recherche l'identifiant (race_id) correspondant
-    dans la table 'races' à partir de la date, de la réunion et du numéro de course.
+    Insère les données de suivi dans la table 'tracking' par executemany.
+    La correspondance (date, reunion, course) -> race_id est lue une seule fois
+    (ou fournie via `race_ids`).
     """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    if race_ids is None:
+        race_ids = race_id_map(conn)
 
+    rows = []
     for entry in results:
         # Vérifier que les champs servant à identifier la course existent
         if entry["date"] is None or entry["reunion"] is None or entry["course"] is None:
             continue
 
-        # Recherche de l'id de la course dans la table races
-        cursor.execute("""
-            SELECT id FROM races WHERE date = ? AND reunion = ? AND course = ?
-        """, (entry["date"], entry["reunion"], entry["course"]))
-        race = cursor.fetchone()
+        # Recherche de l'id de la course dans la correspondance en mémoire
+        race_id = race_ids.get((str(entry["date"]), entry["reunion"], entry["course"]))
 
-        if race is None:
+        if race_id is None:
             print(f"Course non trouvée pour tracking: date={entry['date']}, reunion={entry['reunion']}, course={entry['course']}")
             continue
 
-        race_id = race[0]
-
-        # Insertion de l'enregistrement dans la table tracking
-        cursor.execute("""
-            INSERT INTO tracking (
-                race_id, discipline, numero, nom, classement, vitessemax_kmh, 
-                temps_officiel, derniers600m, derniers200m, derniers100m, 
-                distance_reelle, distance_vainqueur
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            race_id,
-            entry["discipline"],
-            entry["numero"],
-            entry["nom"],
-            entry["classement"],
-            entry["vitessemax_kmh"],
-            str(entry["temps_officiel"]),
-            str(entry["derniers600m"]),
-            str(entry["derniers200m"]),
-            str(entry["derniers100m"]),
-            entry["distance_reelle"],
-            entry["distance_vainqueur"]
-        ))
+        rows.append(tracking_row(entry, race_id))
 
+    conn.executemany(TRACKING_INSERT, rows)
     conn.commit()
+    return len(rows)
+
+def save_to_db(results, db_name="courses.db"):
+    """
+    Enregistre les données de suivi dans la table 'tracking' de la base SQLite existante.
+    Pour chaque enregistrement, le script recherche l'identifiant (race_id) correspondant
+    dans la table 'races' à partir de la date, de la réunion et du numéro de course.
+    """
+    conn = get_connection(db_name)
+    insert_tracking(conn, results)
     conn.close()
     print("Les données de tracking ont été enregistrées dans la base SQLite.")
 
 if __name__ == '__main__':
     # Nom du fichier JSON contenant les données de tracking
-    json_file = "tracking_course.json"  # Adaptez le nom du fichier JSON si nécessaire
+    json_file = "tracking_course.jsonl"  # Adaptez le nom du fichier JSON si nécessaire
 
-    # Lecture et traitement du fichier JSON
-    with open(json_file, "r", encoding="utf-8") as file:
-        data = json.load(file)
+    # Lecture et traitement du fichier JSONL (ou de l'ancien fichier JSON)
+    data = load_records(json_file)
 
     processed_data = process_json(data)
     save_to_db(processed_data)